@@ -5,13 +5,23 @@ This code creates a socket to listen to a specific port receiving data packets d
 INSTRUCTIONS: TDC boards must already be on and connection must already be made with computer, or else socket creation might fail. In correct directory, run command below in command line. The 2nd argument is usually date of run in the form of MonDyYr (Ex: Mar3122).
                 python3 OAxFORTIS_Server.py <insert date/filename modifier>
 OUTPUT: Address of each incoming UDP packet will print in terminal window after the #### Server is listening #### comment. Three csv files will be written as data is read in (located in same directory as this code). You can see the contents of an individual file as it's being written by using the "tail -f <filename>" command in terminal.
+        Files are flushed in groups (by default at least every 250ms or 64KB) rather than after every packet - see --flush-packets, --flush-ms, --flush-bytes and --fsync.
+        Everything is flushed and synced to disk when you ^C.
+SOURCES: packets are routed to files by their source address using the TDC table in OAxFORTIS_registry.py (Zero_, Pos1_, Neg1_).
+        For a different setup pass a JSON table with --sources (see OAxFORTIS_sources.json). Packets are received with asyncio, and
+        --listen ip:port can be given several times to receive on several ports/interfaces at once (default 192.168.1.100:60000).
+        Each socket asks the kernel for an 8MB receive buffer so bursts aren't dropped (--rcvbuf B to change).
 '''
 
-import socket
-import sys
+import argparse
+import asyncio
 import numpy as np
 import time
-import csv
+from OAxFORTIS_decode import PACKET_BYTES, decode_batch, expand_events
+from OAxFORTIS_eventstore import ORDERS, packet_summary
+from OAxFORTIS_receive import listen, receive_buffer
+from OAxFORTIS_registry import Registry, parse_address
+from OAxFORTIS_writers import CsvSink, FlushPolicy, GroupCommitWriter, stop_on_signals
 
 class color:
    PURPLE = '\033[95m'
@@ -26,66 +36,67 @@ class color:
    END = '\033[0m'
 
 #### Inputs ####
-if len(sys.argv) == 2:
-    modifier = sys.argv[1]
-else:
-    print("Run like : python3 server.py <arg1:unique filename modifier (ex: Oct0622)>")
-    exit(1)
+parser = argparse.ArgumentParser(description='Write OAxFORTIS TDC packets to CSV as they come in.')
+parser.add_argument('modifier', help='date/filename modifier (ex: Oct0622)')
+parser.add_argument('--sources', default=None, help='JSON table of TDC sources (see OAxFORTIS_registry.py)')
+parser.add_argument('--listen', action='append', type=parse_address, metavar='IP:PORT', help='address to receive on, can be given several times')
+parser.add_argument('--rcvbuf', type=int, default=1 << 23, help='kernel receive buffer to ask for per socket, in bytes (default 8MB, 0 = system default)')
+FlushPolicy.add_arguments(parser)
+args = parser.parse_args()
+modifier = args.modifier
+policy = FlushPolicy.from_args(args)
+registry = Registry.load(args.sources)
 #these are hardcoded in TDCs that are outputting UDP packets
-ip = '192.168.1.100'
-port = 60000
+listen_addresses = args.listen or registry.listen or [('192.168.1.100', 60000)]
 
 
-#### Create a Socket ####
-s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-# Bind the socket to the port
-server_address = (ip, port)
-s.bind(server_address)
-print("color.BOLD + "Socket created for: ", s.getsockname())
-print(color.BLUE + '####### Server is listening' + color.DARKCYAN + ' ... wait for next message #######' + color.END)
-
-
-#### Receive Data In A 'Forever Loop' And Write To Files ####
+#### Receive Data And Write To Files ####
 base_t = time.time()
 hasprinted = False
 
-with open("Zero_{}.csv".format(modifier),"a") as f0, open("Neg1_{}.csv".format(modifier),"a") as fn1, open("Pos1_{}.csv".format(modifier),"a") as fp1:
-    while True:
-        data, address = s.recvfrom(4096)
-        if data and not hasprinted:
-            print(color.PURPLE + '####### Server has begun receiving packets #######' + color.END)
-            hasprinted = True
-      
-        decdata = list(ord(i) for i in data.decode('utf-16-le',errors='replace')) #decoded data
-        
-        #1458 total bytes in each packet; 729 items in decoded data list - first 3 are num photons, packet num, 0
-        n = decdata[0] # number of events/photons in each packet
-        num_photons = np.repeat(decdata[0],n)
-        packetnum = np.repeat(decdata[1],n)
-        ts = time.time()
-        times = np.repeat(ts-base_t,n)
-        X = np.asarray(decdata[3::3])
-        Y = np.asarray(decdata[4::3])
-        P = np.asarray(decdata[5::3])
-        # only want real events (non-zero pulse height) and no duplicate events
-        X = X[:n]
-        Y = Y[:n]
-        P = P[:n]
-        
-        if n!=0:
-            ## Zero Order File
-            if address == ('192.168.1.10', 62510):
-                writer = csv.writer(f0, delimiter='\t')
-                writer.writerows(zip(packetnum,times,X,Y,P,num_photons))
-                f0.flush() #clear input buffer so file can be written as data comes in
-            ## +1 Order File (270 deg)
-            elif address == ('192.168.1.11', 62510):
-                writer = csv.writer(fp1, delimiter='\t')
-                writer.writerows(zip(packetnum,times,X,Y,P,num_photons))
-                fp1.flush()
-            ## -1 Order File (90 deg)
-            elif address == ('192.168.1.12', 62510):
-                writer = csv.writer(fn1, delimiter='\t')
-                writer.writerows(zip(packetnum,times,X,Y,P,num_photons))
-                fn1.flush()
-        else: pass
+# one file per source, flushed in groups (see OAxFORTIS_writers.py) and always flushed + synced on the way out (^C or kill)
+files = [GroupCommitWriter(CsvSink("{}_{}.csv".format(src.order, modifier), delimiter='\t', summary=True), policy) for src in registry]
+# source number in the packet summaries (<order>_<modifier>.pks): 0 Zero, 1 Pos1, 2 Neg1, as in OAxFORTIS_datacollect.py
+source_numbers = [ORDERS.index(src.order) if src.order in ORDERS else len(ORDERS) + k for k, src in enumerate(registry)]
+
+def handle_packet(k, data, address, ts):
+    global hasprinted
+    if not hasprinted:
+        print(color.PURPLE + '####### Server has begun receiving packets #######' + color.END)
+        hasprinted = True
+    if k < 0: # not one of our TDCs
+        print(address)
+        return
+
+    #1458 total bytes in each packet; 729 words - first 3 are num photons, packet num, 0 (see OAxFORTIS_decode.py)
+    if len(data) < PACKET_BYTES: # runt packet, the missing words are 0
+        data = bytes(data).ljust(PACKET_BYTES, b'\0')
+    packet = decode_batch(data, count=1)
+    times = np.array([ts - base_t])
+    # only want real events (packets with none only go in the packet summary)
+    rows = expand_events(packet, times, min_events=1)
+    files[k].write(rows, packets=1, summary=packet_summary(packet, times, source_numbers[k], min_events=1))
+
+async def serve():
+    transports = await listen(registry, handle_packet, listen_addresses, args.rcvbuf)
+    for transport in transports:
+        print(color.BOLD + "Socket created for: ", transport.get_extra_info('sockname'), color.END + " receive buffer %d KB"%(receive_buffer(transport.get_extra_info('socket')) >> 10))
+    print(color.BLUE + '####### Server is listening' + color.DARKCYAN + ' ... wait for next message #######' + color.END)
+    try:
+        while True:
+            # wake up now and then so time based flushing still happens when packets are slow
+            await asyncio.sleep(policy.timeout() or 1)
+            for f in files:
+                f.poll()
+    finally:
+        for transport in transports:
+            transport.close()
+
+stop_on_signals()
+try:
+    asyncio.run(serve())
+except KeyboardInterrupt: # ^C or kill, see stop_on_signals
+    print(color.BLUE + '####### Stopping, closing files #######' + color.END)
+finally:
+    for f in files:
+        f.close()
@@ -7,14 +7,21 @@ Most Recent Update:
 PUT ME IN THE SAME DIRECTORY AS THE ONE USED FOR rsync!
 It is best to have the folder this resides in sit inside the same folder that your OAxFORTIS_datacollect.py generated folders.
 
-Do not run this code more than once for the same set of downloaded files - this will write duplicate data onto the output files.
+Running this more than once for the same set of downloaded files is safe: what has been converted into the output folder is
+recorded in its VIM_manifest.json, so finished files are skipped and interrupted ones carry on where they stopped (see
+MANIFEST in OAxFORTIS_vim.py).
 
 
 
 INSTRUCTIONS: run as you would any other python script from the command line with no additional arguments
+              or, to convert every unprocessed file number in a folder at once with no prompts (and no plots):
+                python3 OAxFORTIS_VIM2CSV.py <folder with tdc_0/1/2> [--today | --folder NAME] [--jobs N]
+              (see BATCH MODE in OAxFORTIS_vim.py)
+              --max-mb M (either way) caps the memory used for converting at about M MB (default 512).
               
 OUTPUT: 3 new csv files with the same format as generated by OAxFORTIS_datacollect.py. They are saved to either a folder with
-        today's date or titled "UnknownDate".
+        today's date or titled "UnknownDate". Each also gets a packet summary (<order>_VIM#<number>.pks, one record per packet,
+        see OAxFORTIS_eventstore.py) that the count rate plot is made from.
         
         The 3 VIM downloaded csv files with be renamed to add "processed" at the end, such as 0_data-1processed.csv.
 
@@ -28,14 +35,13 @@ OUTPUT: 3 new csv files with the same format as generated by OAxFORTIS_datacolle
 
 import os
 import sys
-import numpy as np
-import time
 import datetime
-import csv
 import matplotlib.pyplot as plt
 import matplotlib
 from matplotlib import colors
-import matplotlib.gridspec as gridspec
+from OAxFORTIS_vim import convert_recorded, arguments, chunk_for, QuickLook, PH_EDGES, main as batch_main
+from OAxFORTIS_rates import rate_curve
+from OAxFORTIS_eventstore import read_summary
 matplotlib.rcParams.update({'font.size': 8})
 class color: #because why not
    PURPLE = '\033[95m'
@@ -51,6 +57,10 @@ class color: #because why not
 
 
 
+args = arguments(batch=False)
+if args.directory is not None: # batch mode, no prompts
+    sys.exit(batch_main(args=args))
+
 filenum = input(color.BOLD + "Enter File # (as in 0_data-#.csv): " + color.END)
 
 
@@ -78,90 +88,16 @@ else:
 ######################################################################################
 ##### ---- Select and Read in Files, Decode & Sort Data, and Write to Files  ---- ####
 ######################################################################################
-with open("../{}/Zero_VIM#{}.csv".format(foldername,filenum),"a") as f0, open("../{}/Neg1_VIM#{}.csv".format(foldername,filenum),"a") as fn1, open("../{}/Pos1_VIM#{}.csv".format(foldername,filenum),"a") as fp1:
-
-    ###### ---- ZERO ORDER ---- ######
-    ZeroFile = './tdc_0/0_data-{}.csv'.format(filenum)
-    if os.path.getsize(ZeroFile) > 0:  #check if file has any data
-        Zero = np.genfromtxt(ZeroFile, dtype='str', delimiter='\t')
-
-        t0 = float(Zero[0][1])
-        for row in Zero:
-            data = np.fromstring(row[2][1:-1], dtype=int, sep=',')
-
-            n = data[0] # Number of events/photons in each packet
-            num_photons = np.repeat(data[0],n)
-            packetnum = np.repeat(data[1],n)
-            t = float(row[1]) - t0 #start timestamp at 0 seconds
-            times = np.repeat(t,n)
-            X = np.asarray(data[3::3])
-            Y = np.asarray(data[4::3])
-            P = np.asarray(data[5::3])
-            
-            if n>1:
-                # only want real events and no duplicate events
-                X = X[:n]
-                Y = Y[:n]
-                P = P[:n]
-
-                writer = csv.writer(f0, delimiter=',')
-                writer.writerows(zip(packetnum,times,X,Y,P,num_photons))
-            else: pass
-
-
-    ###### ---- +1 ORDER ---- ######
-    Pos1File = './tdc_1/1_data-{}.csv'.format(filenum)
-    if os.path.getsize(Pos1File) > 0:
-        Pos1 = np.genfromtxt(Pos1File, delimiter='\t', dtype='str')
-        
-        #t0 = float(Pos1[0][1])
-        for row in Pos1:
-            data = np.fromstring(row[2][1:-1], dtype=int, sep=',')
-            n = data[0]
-            num_photons = np.repeat(data[0],n)
-            packetnum = np.repeat(data[1],n)
-            t = float(row[1]) - t0
-            times = np.repeat(t,n)
-            X = np.asarray(data[3::3])
-            Y = np.asarray(data[4::3])
-            P = np.asarray(data[5::3])
-            
-            if n>1:
-                X = X[:n]
-                Y = Y[:n]
-                P = P[:n]
-                
-                writer = csv.writer(fp1, delimiter=',')
-                writer.writerows(zip(packetnum,times,X,Y,P,num_photons))
-            else: pass
-           
-           
-    ###### ---- -1 ORDER ---- ######
-    Neg1File = './tdc_2/2_data-{}.csv'.format(filenum)
-    if os.path.getsize(Neg1File) > 0:
-        Neg1 = np.genfromtxt(Neg1File, delimiter='\t', dtype='str')
-        
-        #t0 = float(Neg1[0][1])
-        for row in Neg1:
-            data = np.fromstring(row[2][1:-1], dtype=int, sep=',')
-
-            n = data[0]
-            num_photons = np.repeat(data[0],n)
-            packetnum = np.repeat(data[1],n)
-            t = float(row[1]) - t0
-            times = np.repeat(t,n)
-            X = np.asarray(data[3::3])
-            Y = np.asarray(data[4::3])
-            P = np.asarray(data[5::3])
-            
-            if n>1:
-                X = X[:n]
-                Y = Y[:n]
-                P = P[:n]
-                
-                writer = csv.writer(fn1, delimiter=',')
-                writer.writerows(zip(packetnum,times,X,Y,P,num_photons))
-            else: pass
+# each dump is parsed in big chunks and its events written in bulk (see OAxFORTIS_vim.py)
+# time stamps start at 0 seconds at the first zero order packet (or the first packet of the first non-empty file)
+# and the events go into running histograms for the plots as they are written
+t0 = None
+quicklooks = {'Zero': QuickLook([2400,12600]), 'Pos1': QuickLook([3200,13300]), 'Neg1': QuickLook([3450,13350])} # projection X ranges
+for tdc, order in ((0, 'Zero'), (1, 'Pos1'), (2, 'Neg1')):
+    VIMFile = './tdc_{}/{}_data-{}.csv'.format(tdc, tdc, filenum)
+    t0, nrows, _, status = convert_recorded(VIMFile, "../{}/{}_VIM#{}.csv".format(foldername, order, filenum), t0, # only packets with more than one event
+                                            chunk_bytes=chunk_for(args.max_mb), quicklook=quicklooks[order], source=tdc)
+    print('{}: {} events ({})'.format(VIMFile, nrows, status))
 
 
 
@@ -185,57 +121,16 @@ if prompt2 == 'yes' or prompt2 == 'y':
     
     os.chdir('../{}'.format(foldername)) #enter correct data folder
     
-    ################### ---- Read in generated CSVs ---- #########################
-    data0 = []       # packet data (each row contain x coordinate, y coordinate, pulse height)
-    ZeroFile = "./Zero_VIM#{}.csv".format(filenum)
-    if os.path.getsize(ZeroFile) > 0:  #check if file has any data
-        Zero = np.loadtxt(ZeroFile, delimiter=',')
-        for row in Zero:
-            if int(row[4]) != 0:    #pulse height constraints
-                data0.append([int(row[2]),int(row[3]),int(row[4])]) #X,Y,P
-        data0 = np.asarray(data0)
-        Times = Zero.T[1] # Packet Time Stamp
-        Time0 = Times[np.insert(np.diff(Times).astype(bool), 0, True)] #skip duplicates
-        Time0b = np.insert(Time0, 0, 0., axis=0) #array of previous times, add zero to beginning to offset time stamp array
-        Time0b = np.delete(Time0b,-1)
-        Counts0 = Zero.T[5] # Num Photons in each Packet
-        Counts0 = Counts0[np.insert(np.diff(Times).astype(bool), 0, True)]
-        packnum0 = Zero.T[0]
-        packnum0 = packnum0[np.insert(np.diff(Times).astype(bool), 0, True)]
-
-    datap1 = []
-    Pos1File = "./Pos1_VIM#{}.csv".format(filenum)
-    if os.path.getsize(Pos1File) > 0:
-        Pos1 = np.loadtxt(Pos1File, delimiter=',')
-        for row in Pos1:
-            if int(row[4]) != 0:
-                datap1.append([int(row[2]),int(row[3]),int(row[4])])
-        datap1 = np.asarray(datap1)
-        Times = Pos1.T[1]
-        Timep1 = Times[np.insert(np.diff(Times).astype(bool), 0, True)]
-        Timep1b = np.insert(Timep1, 0, 0., axis=0)
-        Timep1b = np.delete(Timep1b,-1)
-        Countsp1 = Pos1.T[5]
-        Countsp1 = Countsp1[np.insert(np.diff(Times).astype(bool), 0, True)]
-        packnump1 = Pos1.T[0]
-        packnump1 = packnump1[np.insert(np.diff(Times).astype(bool), 0, True)]
-
-    datan1 = []
-    Neg1File = "./Neg1_VIM#{}.csv".format(filenum)
-    if os.path.getsize(Neg1File) > 0:
-        Neg1 = np.loadtxt(Neg1File, delimiter=',')
-        for row in Neg1:
-            if int(row[4]) != 0:
-                datan1.append([int(row[2]),int(row[3]),int(row[4])])
-        datan1 = np.asarray(datan1)
-        Times = Neg1.T[1]
-        Timen1 = Times[np.insert(np.diff(Times).astype(bool), 0, True)]
-        Timen1b = np.insert(Timen1, 0, 0., axis=0)
-        Timen1b = np.delete(Timen1b,-1)
-        Countsn1 = Neg1.T[5]
-        Countsn1 = Countsn1[np.insert(np.diff(Times).astype(bool), 0, True)]
-        packnumn1 = Neg1.T[0]
-        packnumn1 = packnumn1[np.insert(np.diff(Times).astype(bool), 0, True)]
+    ################### ---- Quick-look histograms filled during conversion ---- #########################
+    # (OAxFORTIS_vim.QuickLook - the generated CSVs aren't read back in)
+    ql0, qlp1, qln1 = quicklooks['Zero'], quicklooks['Pos1'], quicklooks['Neg1']
+    # one record per packet: the outputs' packet summaries, which have every packet of the dumps (see OAxFORTIS_eventstore.py),
+    # or for files converted before those were written, the packets that made it into the csv
+    packets0, packetsp1, packetsn1 = [read_summary('{}_VIM#{}'.format(order, filenum)) for order in ('Zero', 'Pos1', 'Neg1')]
+    packets0, packetsp1, packetsn1 = [packets if len(packets) else ql.packets() for packets, ql in ((packets0, ql0), (packetsp1, qlp1), (packetsn1, qln1))]
+    Time0, Rows0, Counts0 = packets0['time'], packets0['count'], packets0['n'] # Packet Time Stamps, rows and Num Photons in each Packet
+    Timep1, Rowsp1, Countsp1 = packetsp1['time'], packetsp1['count'], packetsp1['n']
+    Timen1, Rowsn1, Countsn1 = packetsn1['time'], packetsn1['count'], packetsn1['n']
 
     ###################### --- SET UP FIGURES --- ############################
     ## Window 3: Count rate plots & pulse height distributions
@@ -254,22 +149,21 @@ if prompt2 == 'yes' or prompt2 == 'y':
     fig1.subplots_adjust(hspace=.075,wspace=0)
     
     ################# --- 2D Hist Plots of X,Y points --- #######################
-    fullrange = [[-10,16400],[-10,16400]]
     fullextent = [-10,16400,-10,16400]
 
-    if len(data0)>0:
+    if ql0.events>0:
         ## Zero Order 2D Histogram
-        init0,_,_ = np.histogram2d(data0.T[0], data0.T[1], bins=[355,355], density=True, range=fullrange)#[[2400,12600],[1850,12050]]) #range=[[1750,13250],[1500,13000]]
+        init0 = ql0.density() #[[2400,12600],[1850,12050]] #range=[[1750,13250],[1500,13000]]
         XY0.imshow(init0.T, interpolation='nearest', origin='lower', aspect='auto', cmap='magma', norm = colors.LogNorm(), extent=fullextent)#[2400,12600,1850,12050])
         XY0.set_title('Zero Order')
         XY0.set_xlabel('X')
         
         ## Small Projection
-        n, bins, _ = Proj0.hist(data0.T[0], 1000, range=[2400,12600], color='black', histtype='step') #range=[1750,13250]
+        n, bins, _ = Proj0.hist(ql0.proj_edges[0][:-1], ql0.proj_edges[0], weights=ql0.proj[0], color='black', histtype='step') #range=[1750,13250]
         Proj0.set_xlim(2400,12600)
 
         ## Large Projection
-        n, bins, _ = prjs[1].hist(data0.T[0], 1500, range=[2400,12600], color='darkorange', histtype='step',label='Zero Order')
+        n, bins, _ = prjs[1].hist(ql0.proj_edges[1][:-1], ql0.proj_edges[1], weights=ql0.proj[1], color='darkorange', histtype='step',label='Zero Order')
         #prjs[1].set_yscale('log')
         #prjs[1].set_ylim(0,1000)
         prjs[1].set_xlim(2400,12600)
@@ -277,40 +171,40 @@ if prompt2 == 'yes' or prompt2 == 'y':
         prjs[1].set_ylabel('Projected Counts')
         
 
-    if len(datap1)>0:
+    if qlp1.events>0:
         ## +1 Order 2D Histogram
-        initp1,_,_ = np.histogram2d(datap1.T[0], datap1.T[1], bins=[355,355], density=True, range=fullrange)#[[3200,13300],[2300,12200]]) #[[1700,13800],[2100,13090]]
+        initp1 = qlp1.density() #[[3200,13300],[2300,12200]] #[[1700,13800],[2100,13090]]
         XYp1.imshow(initp1.T, interpolation='nearest', origin='lower', aspect='auto', cmap='magma', norm = colors.LogNorm(), extent=fullextent)#[3200,13300,2300,12200])
         XYp1.set_title('+1 Order (270°)')
         
         ## Small Projection
-        n, bins, _ = Projp1.hist(datap1.T[0], 1000, range=[3200,13300], color='black', histtype='step')
+        n, bins, _ = Projp1.hist(qlp1.proj_edges[0][:-1], qlp1.proj_edges[0], weights=qlp1.proj[0], color='black', histtype='step')
         Projp1.set_xlim(3200,13300)
         
         ## Large Projection
-        n, bins, _ = prjs[0].hist(datap1.T[0], 1500, range=[3200,13300], color='mediumblue', histtype='step',label='+1 Order')
+        n, bins, _ = prjs[0].hist(qlp1.proj_edges[1][:-1], qlp1.proj_edges[1], weights=qlp1.proj[1], color='mediumblue', histtype='step',label='+1 Order')
         #prjs[0].set_yscale('log')
         #prjs[0].set_ylim(0,50)
         prjs[0].set_xlim(3200,13300)
         prjs[0].legend()
     
     
-    if len(datan1)>0:
+    if qln1.events>0:
         ## -1 Order 2D Histogram
-        initn1,_,_ = np.histogram2d(datan1.T[0], datan1.T[1], bins=[355,355], density=True, range=fullrange)#[[3450,13350],[2000,11700]]) #Steve's: [[1900,13400],[2100,12890]] #mine old: [[2000,13500],[2100,12700]]
+        initn1 = qln1.density() #[[3450,13350],[2000,11700]] #Steve's: [[1900,13400],[2100,12890]] #mine old: [[2000,13500],[2100,12700]]
         XYn1.imshow(initn1.T, interpolation='nearest', origin='lower',aspect='auto', cmap='magma', norm = colors.LogNorm(), extent=fullextent)#[3450,13350,2000,11700])
         XYn1.set_title('-1 Order (90°)')
         XYn1.set_ylabel('Y')
         XYn1.invert_xaxis()
         
         ## Small Projection
-        n, bins, _ = Projn1.hist(datan1.T[0], 1000, range=[3450,13350], color='black', histtype='step')
+        n, bins, _ = Projn1.hist(qln1.proj_edges[0][:-1], qln1.proj_edges[0], weights=qln1.proj[0], color='black', histtype='step')
         Projn1.set_xlim(3450,13350)
         Projn1.invert_xaxis()
         Projn1.set_ylabel('Projected Counts')
         
         ## Large Projection
-        n, bins, _ = prjs[2].hist(datan1.T[0], 1500, range=[3450,13350], color='mediumvioletred', histtype='step',label='-1 Order')
+        n, bins, _ = prjs[2].hist(qln1.proj_edges[1][:-1], qln1.proj_edges[1], weights=qln1.proj[1], color='mediumvioletred', histtype='step',label='-1 Order')
         #prjs[2].set_yscale('log')
         #prjs[2].set_ylim(0,1000)
         prjs[2].set_xlim(3450,13350)
@@ -319,12 +213,12 @@ if prompt2 == 'yes' or prompt2 == 'y':
         prjs[2].set_xlabel('X-Pixel')
 
     ############# --- Pulse Height Histograms --- ##############################################
-    if len(data0)>0:
-        n, bins, _ = PH.hist(data0.T[2], bins = np.arange(10,260,10), color = 'darkorange', histtype='step', lw=2, label='Zero Order') #max pulse height is 255
-    if len(datap1)>0:
-        n, bins, _ = PH.hist(datap1.T[2], bins = np.arange(10,260,10), color = 'mediumblue', histtype='step', lw=2, label='+1 Order')
-    if len(datan1)>0:
-        n, bins, _ = PH.hist(datan1.T[2], bins = np.arange(10,260,10), color = 'mediumvioletred', histtype='step', lw=2, label='-1 Order')
+    if ql0.events>0:
+        n, bins, _ = PH.hist(PH_EDGES[:-1], bins=PH_EDGES, weights=ql0.ph, color = 'darkorange', histtype='step', lw=2, label='Zero Order') #max pulse height is 255
+    if qlp1.events>0:
+        n, bins, _ = PH.hist(PH_EDGES[:-1], bins=PH_EDGES, weights=qlp1.ph, color = 'mediumblue', histtype='step', lw=2, label='+1 Order')
+    if qln1.events>0:
+        n, bins, _ = PH.hist(PH_EDGES[:-1], bins=PH_EDGES, weights=qln1.ph, color = 'mediumvioletred', histtype='step', lw=2, label='-1 Order')
     PH.legend()
     PH.set_title('Pulse Height Histograms')
     PH.set_xlabel('Pulse Height')
@@ -332,53 +226,32 @@ if prompt2 == 'yes' or prompt2 == 'y':
     
     ############## --- Count Rate Calculations --- ####################################################
     # Average Count Rates = num of events / total time data taken
-    if len(data0)>0:
-        AvgCntRt_0 = len(data0.T[0])/(Time0[-1]-Time0[0])
+    if ql0.events>0:
+        AvgCntRt_0 = ql0.events/(Time0[-1]-Time0[0])
         text_0 = '%.1f counts/s'%(AvgCntRt_0)
-    if len(datap1)>0:
-        AvgCntRt_p1 = int(sum(Countsp1)/(Timep1[-1]-Timep1[0]))
+    if qlp1.events>0:
+        AvgCntRt_p1 = int(Countsp1.sum()/(Timep1[-1]-Timep1[0]))
         text_p1 = '%.1f counts/s'%(AvgCntRt_p1)
-    if len(datan1)>0:
-        AvgCntRt_n1 = int(sum(Countsn1)/(Timen1[-1]-Timen1[0]))
+    if qln1.events>0:
+        AvgCntRt_n1 = int(Countsn1.sum()/(Timen1[-1]-Timen1[0]))
         text_n1 = '%.1f counts/s'%(AvgCntRt_n1)
         
     # Instantaneous Rate Plots
-    #only calculate rate at every 1.5sec timestamp interval
-    if len(data0)>0:
-        last_calculation_time = 0
-        InstRt0 = []
-        T0 = []
-        for o in range(len(Time0)-1):
-            if Time0[o] - last_calculation_time >= 1.5:
-                InstRt0.append(Counts0[o]/(Time0[o]-Time0b[o]))
-                T0.append(Time0[o])
-                last_calculation_time = Time0[o]
-    if len(datap1)>0:
-        InstRtp1 = []
-        Tp1 = []
-        last_calculation_time = 0
-        for p in range(len(Timep1)-1):
-            if Timep1[p] - last_calculation_time >= 1.5:
-                InstRtp1.append(Countsp1[p]/(Timep1[p]-Timep1b[p]))
-                Tp1.append(Timep1[p])
-                last_calculation_time = Timep1[p]
-    if len(datan1)>0:
-        InstRtn1 = []
-        Tn1 = []
-        last_calculation_time = 0
-        for n in range(len(Timen1)-1):
-            if Timen1[n] - last_calculation_time >= 1.5:
-                InstRtn1.append(Countsn1[n]/(Timen1[n]-Timen1b[n]))
-                Tn1.append(Timen1[n])
-                last_calculation_time = Timen1[n]
+    #rate over every 1.5sec of packets - the same sliding window rate the live display shows (see OAxFORTIS_rates.py)
+    if ql0.events>0:
+        T0, InstRt0 = rate_curve(Time0, Rows0, step=1.5)
+    if qlp1.events>0:
+        Tp1, InstRtp1 = rate_curve(Timep1, Rowsp1, step=1.5)
+    if qln1.events>0:
+        Tn1, InstRtn1 = rate_curve(Timen1, Rowsn1, step=1.5)
                 
-    if len(data0)>0:
+    if ql0.events>0:
         CR.plot(T0, InstRt0, lw=2, color='darkorange', label='Zero Order, %.1f counts/s'%(AvgCntRt_0))
         #n, bins, _ = CR.hist(Time0, 1, lw=2, color='darkorange', histtype='step',label='Zero Order')
-    if len(datap1)>0:
+    if qlp1.events>0:
         CR.plot(Tp1, InstRtp1, lw=2, color='mediumblue', label='+1 Order, %.1f counts/s'%(AvgCntRt_p1))
         #n, bins, _ = CR.hist(Timep1, 1, lw=2, color='mediumblue', histtype='step',label='+1 Order')
-    if len(datan1)>0:
+    if qln1.events>0:
         CR.plot(Tn1, InstRtn1, lw=2, color='mediumvioletred', label='-1 Order, %.1f counts/s'%(AvgCntRt_n1))
         #n, bins, _ = CR.hist(Timen1, 1, lw=2, color='mediumvioletred', histtype='step',label='-1 Order')
     CR.legend()
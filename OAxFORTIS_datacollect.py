@@ -11,8 +11,13 @@ This code:
     (4) presents a window of plots that update live
 If you want post-acquisition analysis, use OAxFORTISplots.py
 
+The live window runs in its own process (OAxFORTIS_display.py). This process only reads the socket and writes the files; it hands the
+display a snapshot of the histograms and count rates every 0.75s through a small queue, and if the window can't keep up that
+snapshot is skipped. A slow redraw can therefore never cost packets. Only panels with new data are redrawn (blitted), and
+--fps F / --display-load L cap how often the window redraws and what fraction of the time it may spend drawing (default 1.33, 0.25).
 
-To capture data this code creates a socket to listen to a specific port receiving UDP packets destined for a specific IP address.For each UDP packet received it will decode the raw little endian data, extract data for each event (see format below), and assign a time stamp to the packets
+
+To capture data this code creates a socket to listen to a specific port receiving UDP packets destined for a specific IP address.For each UDP packet received it will decode the raw little endian data (OAxFORTIS_decode.py), extract data for each event (see format below), and assign a time stamp to the packets
 
 Anticipated UDP Packet format: (see TDC manual for byte structure of packets)
 - 1458 total bytes in each packet
@@ -27,27 +32,77 @@ Anticipated UDP Packet format: (see TDC manual for byte structure of packets)
 INITIATING INSTRUCTIONS: TDC boards and/or switch must already be on and connection must already be made with computer, or else socket creation will fail.
     In correct directory, run command below in command line. The 2nd argument is a filename modifier of your choice, such as "test1" (you can just use a space if you want to be rebellious).
                 python OAxFORTIS_datacollect.py <insert modifier>
+    Optional: --ring <N> sets how many packets the receive ring buffer holds (default 512). Every packet waiting on the socket is read in one go
+    (see OAxFORTIS_receive.py) and the whole batch is decoded, histogrammed and written at once.
                 
 WHILE RUNNING: Upon successful creation of a socket, "#### Server is listening ####" will print to command line and you'll be told to wait patiently for the next printout. Note: If you just recently powered the electronics, the switch will take ~15sec to boot up. Once a packet has been received, "####### Server has begun receiving packets #######" will print to the command line. At this point if you turn on the high voltage for the spectral and/or imaging channels, a window will pop up with XY 2D histogram plots & count rates that should automatically update as data is read in.
     
-TO ESCAPE: Find your way back to the terminal. ^C to stop everything.
+TO ESCAPE: Find your way back to the terminal. ^C to stop everything. Closing the plot window does not stop data collection.
 
 OUTPUT: Three CSV files will be written to the newly created subfolder as data is read in.
+        With --binary, each order is written as a compact <order>_<modifier>.evt/.pkt pair instead (about 5 bytes per event instead of ~40).
+        OAxFORTISplots.py reads these directly; "python OAxFORTIS_eventstore.py <folder> <modifier>" converts them to the usual CSVs.
+        Files are flushed in groups rather than after every packet: by default at least every 250ms (so "tail -f" stays live) or every 64KB.
+        Change this with --flush-packets N, --flush-ms T, --flush-bytes B, and add --fsync S to also sync to disk every S seconds.
+        Everything is flushed and synced when you ^C.
+        For long runs, --rotate-mb N and/or --rotate-min M split each order into segments (Zero_<modifier>_s000.csv, _s001, ...) of about
+        N MB or M minutes, listed with their time span, packet numbers and event count in Zero_<modifier>.segments.json (see OAxFORTIS_segments.py).
+        OAxFORTISplots.py reads them as one run, or only the segments covering a time window.
+        With --journal, every raw packet is also kept exactly as received in raw_<modifier>.jrn/.jdx (see OAxFORTIS_journal.py).
+        Every output file also gets a packet summary, <order>_<modifier>.pks: one small record per packet received (packet num, time stamp,
+        num photons, events written and where they start in the file - see OAxFORTIS_eventstore.py), which the count rates and packet loss in
+        OAxFORTISplots.py and OAxFORTIS_stats.py are worked out from.
+
+OTHER VIEWERS: the live histograms, rates and packet counters are also kept in shared memory (OAxFORTIS_live, --shm NAME to rename, --shm ""
+    to turn off), so a second window or a headless snapshot dumper can watch without slowing this down:
+                python OAxFORTIS_shm.py [--plot] [--dump FOLDER]
+
+METRICS: with --metrics PORT, packet/event rates, bytes written, stage timings, queue depths, sequence gaps and kernel drops are served in
+    Prometheus text format at http://127.0.0.1:PORT/metrics (e.g. watch -n1 'curl -s localhost:9101/metrics'), see OAxFORTIS_metrics.py.
+
+COUNT RATES: the rate shown is the events per second over the last 1.5s of packets (--rate-window S to change), computed the same way as the
+    rate plots in OAxFORTISplots.py (see OAxFORTIS_rates.py). The terminal status also shows a smoothed rate (EWMA, 5s time constant).
+
+RECEIVE PATH HEALTH: the packet number of every packet is checked (see OAxFORTIS_stats.py). Lost, duplicated and reordered packets and the
+    packet arrival jitter are shown under each count rate in the live window, along with decode/write times, and printed to the terminal every
+    10s (--status S to change, 0 to turn off). If packets are being lost, a low count rate may be the receive path falling behind, not the source.
+    The footer also shows how many packets the kernel dropped because the socket's receive buffer was full (read from /proc/net/udp). Lost
+    packets that aren't kernel drops were lost on the way (TDC, switch, cable). The buffer is 8MB by default (--rcvbuf B); the kernel caps it at
+    net.core.rmem_max, and a warning is printed if it granted less. --rxq-ovfl also takes the drop count from every packet (SO_RXQ_OVFL).
+
+ZOOMING: use the plot window's zoom/pan tools on any order. The zoomed region is redrawn from a multi-resolution image of the whole detector
+    (OAxFORTIS_hist.py) at the finest binning that fits the window, down to single pixels, without waiting for new data. Home goes back.
+
+SOURCES: packets are routed by their source address using the TDC table in OAxFORTIS_registry.py. For a different setup (more TDCs, a bench)
+    pass a JSON table with --sources (see OAxFORTIS_sources.json). --listen ip:port (can be repeated) receives on several ports/interfaces at once.
+
+TESTING WITHOUT HARDWARE: run this with --local, then in another terminal replay a journal or old data files at it, e.g.
+                python OAxFORTIS_replay.py Zero_Feb0123.csv Neg1_Feb0123.csv --speed 10
+    (see OAxFORTIS_replay.py for options)
 '''
 
 
-import socket
 import os
-import sys
+import argparse
 import numpy as np
 import time
+import queue
 import datetime
-import csv
-import matplotlib.pyplot as plt
-import matplotlib
-from matplotlib import colors
-import matplotlib.gridspec as gridspec
-matplotlib.rcParams.update({'font.size': 8})
+import multiprocessing
+from OAxFORTIS_decode import expand_events, MAX_EVENTS
+from OAxFORTIS_receive import PacketRing, KernelDropMonitor, open_socket
+from OAxFORTIS_eventstore import EventStore, ORDERS, packet_summary
+from OAxFORTIS_segments import SegmentedSink
+from OAxFORTIS_journal import JournalSink
+from OAxFORTIS_replay import local_sources
+from OAxFORTIS_registry import Registry, parse_address
+from OAxFORTIS_hist import OrderAccumulator
+from OAxFORTIS_rates import RateMeter
+from OAxFORTIS_shm import LivePublisher, DEFAULT_NAME
+from OAxFORTIS_metrics import Metrics, MetricsServer
+from OAxFORTIS_stats import SequenceTracker, LatencyHistogram
+from OAxFORTIS_writers import CsvSink, FlushPolicy, GroupCommitWriter, stop_on_signals
+from OAxFORTIS_display import run_display, send_update
 today = datetime.date.today()
 now = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
 UTCnow = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
@@ -64,235 +119,258 @@ class color: #because why not
    UNDERLINE = '\033[4m'
    END = '\033[0m'
 
-## ---- Set Output Folder & Filename ---- ##
-if len(sys.argv) == 2:
-    modifier = sys.argv[1]
+t_int = 0.75 # seconds between plot updates
+
+
+if __name__ == '__main__':
+    ## ---- Set Output Folder & Filename ---- ##
+    parser = argparse.ArgumentParser(description='Collect OAxFORTIS TDC packets, write them to CSV and plot them live.')
+    parser.add_argument('modifier', help='unique filename modifier (ex: Oct0622)')
+    parser.add_argument('--ring', type=int, default=512, help='number of packet slots in the receive ring buffer (default 512)')
+    parser.add_argument('--binary', action='store_true', help='write compact binary .evt/.pkt files instead of CSV (see OAxFORTIS_eventstore.py)')
+    parser.add_argument('--rotate-mb', type=float, default=None, help='start a new segment of each output file every N MB (see OAxFORTIS_segments.py)')
+    parser.add_argument('--rotate-min', type=float, default=None, help='start a new segment of each output file every N minutes')
+    parser.add_argument('--journal', action='store_true', help='also keep every raw packet in ./<date>/raw_<modifier>.jrn/.jdx (see OAxFORTIS_journal.py)')
+    parser.add_argument('--status', type=float, default=10, help='print packet loss/jitter/timing stats to the terminal every S seconds (0 = never, default 10)')
+    parser.add_argument('--local', action='store_true', help='accept packets from the local addresses OAxFORTIS_replay.py sends from')
+    parser.add_argument('--sources', default=None, help='JSON table of TDC sources (see OAxFORTIS_registry.py)')
+    parser.add_argument('--listen', action='append', type=parse_address, metavar='IP:PORT', help='address to receive on, can be given several times (default :60000)')
+    parser.add_argument('--rcvbuf', type=int, default=1 << 23, help='kernel receive buffer to ask for per socket, in bytes (default 8MB, 0 = system default)')
+    parser.add_argument('--rxq-ovfl', action='store_true', help='also get the kernel drop count with every packet (SO_RXQ_OVFL, Linux)')
+    parser.add_argument('--shm', default=DEFAULT_NAME, metavar='NAME', help='shared memory name other viewers attach to (default %s, "" = none, see OAxFORTIS_shm.py)'%DEFAULT_NAME)
+    parser.add_argument('--metrics', type=int, default=None, metavar='PORT', help='serve Prometheus metrics on http://127.0.0.1:PORT/metrics (see OAxFORTIS_metrics.py)')
+    parser.add_argument('--rate-window', type=float, default=1.5, help='seconds of packets the live count rate is averaged over (default 1.5, as in OAxFORTISplots.py)')
+    parser.add_argument('--fps', type=float, default=1/t_int, help='most live window frames per second (default %.2f)'%(1/t_int))
+    parser.add_argument('--display-load', type=float, default=0.25, help='largest fraction of the time the live window may spend drawing (default 0.25)')
+    FlushPolicy.add_arguments(parser)
+    args = parser.parse_args()
+    policy = FlushPolicy.from_args(args)
+    t_int = 1/args.fps
+
+    # Each order is one TDC, looked up by the address its packets come from
+    registry = Registry.load(args.sources)
+    if args.local:
+        for tdc, local in local_sources().items():
+            if tdc in registry.index:
+                registry.alias(local, tdc)
+    nsrc = len(registry)
+
+    modifier = args.modifier
     folder = "./{}".format(today)
     if not os.path.isdir(folder):
         os.makedirs(folder)
-else:
-    print(color.BOLD + "Run like : python3 server.py <arg1:unique filename modifier (ex: Oct0622)>" + color.END)
-    exit(1)
-    
 
 
 
-######################################################################################
-##################### ---- Initial Socket and Plot Settings ---- #####################
-######################################################################################
-
-## ---- Create A Socket ---- ##
-#TDCs are set to send packets to this ip,port combo
-ip = ''     #open to broadcast ip='' and adapter set to 192.168.1.2 -- for unicast set ip='192.168.1.100' and same for adapter
-port = 60000
-s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-server_address = (ip, port)
-s.bind(server_address)
-print(color.BOLD + "Socket created for: ", s.getsockname()) #check ip and port being used
-print(color.BLUE + '####### Server is listening' + color.DARKCYAN + ' ... wait for next message #######' + color.END)
-
-## ---- Initiate Empty Plots ---- ##
-asp = 63.5/43
-gs_kw = dict(width_ratios=[asp,1,asp], height_ratios=[1,1] )
-fig, ((XYn1, XY0, XYp1), (txtn1, txt0, txtp1)) = plt.subplots(nrows=2, ncols=3, sharey=True, gridspec_kw=gs_kw, figsize=(16,7))
-fig.subplots_adjust(hspace=.075,wspace=0)
-
-XYp1.set_title('+1 Order (270°)')
-XY0.set_title('Zero Order')
-XYn1.set_title('-1 Order (90°)')
-txtp1.axis('off')
-txt0.axis('off')
-txtn1.axis('off')
-
-vmin = 1000 #arbitrary so imshow doesn't yell at me :(
-vmax = 10000
-plot1 = XYp1.imshow(np.zeros((10, 10)), interpolation='nearest', cmap='magma', norm=colors.LogNorm(vmin=vmin,vmax=vmax), origin='lower', extent=[1700,13800,2100,13090], aspect='auto')
-plot2 = XY0.imshow(np.zeros((10, 10)), interpolation='nearest', cmap='magma', norm=colors.LogNorm(vmin=vmin,vmax=vmax), origin='lower', extent=[1300,13500,1750,13090], aspect='auto')
-plot3 = XYn1.imshow(np.zeros((10, 10)), interpolation='nearest', cmap='magma', norm=colors.LogNorm(vmin=vmin,vmax=vmax), origin='lower', extent=[1900,13400,2100,13090], aspect='auto')
-XYn1.invert_xaxis()
-
-text1 = XYp1.text(0.15,-0.2,'', fontsize=10, weight="bold", transform=XYp1.transAxes) 
-text2 = XY0.text(0.1,-0.2,'', fontsize=10, weight="bold", transform=XY0.transAxes) 
-text3 = XYn1.text(0.2,-0.2,'', fontsize=10, weight="bold", transform=XYn1.transAxes) 
-
-
-
-
-######################################################################################
-#### ---- Receive Data In A 'Forever Loop', Update Plots, And Write To Files ---- ####
-######################################################################################
-base_t = time.time()
-last_calculation_time = base_t
-prev_tp1 = None
-prev_t0 = None
-prev_tn1 = None
-newhist1 = []
-newhist2 = []
-newhist3 = []
-hist1 = np.empty((355,355))
-hist2 = np.empty((355,355))
-hist3 = np.empty((355,355))
-hasprinted = False
-
-
-with open("./{}/Zero_{}.csv".format(today,modifier),"a") as f0, open("./{}/Neg1_{}.csv".format(today,modifier),"a") as fn1, open("./{}/Pos1_{}.csv".format(today,modifier),"a") as fp1:           
-    while True:
-        data, address = s.recvfrom(1458)
-        if data and not hasprinted:
-            print(color.PURPLE + '####### Server has begun receiving packets #######' + color.END)
-            hasprinted = True
-                
-        decdata = list(ord(i) for i in data.decode('utf-16-le',errors='replace'))
-        
-        n = decdata[0] # Number of events/photons in each packet
-        num_photons = np.repeat(decdata[0],n)
-        packetnum = np.repeat(decdata[1],n)
-        t = time.time() - base_t # Packet Time Stamp
-        times = np.repeat(t,n)
-        X = np.asarray(decdata[3::3])
-        Y = np.asarray(decdata[4::3])
-        P = np.asarray(decdata[5::3])
-        
-        if n>1:
-            # only want real events (non-zero pulse height) and no duplicate events
-            X = X[:n]
-            #X = X[P!=0]
-            Y = Y[:n]
-            #Y = Y[P!=0]
-            P = P[:n]
-            #P = P[P!=0]
-            
-            ###############################################
-            ################ +1 Order (270°) ##############
-            ###############################################
-            if address == ('192.168.1.11', 62510):
-                if prev_tp1 is not None:
-                    del_tp1 = t - prev_tp1
-                else:
-                    del_tp1 = t
-                prev_tp1 = t
-                CntRt_p1 = n/del_tp1
-                text1.set_text('+1 Order Inst Rate: %.0f counts/s'%(CntRt_p1))
-                newhist1,x,y = np.histogram2d(X,Y, bins=[355,355], range=[[1700,13800],[2100,13090]])
-                hist1 = np.add(hist1,newhist1)
-                ''' uncommenting this chunk of code (and those in other 2 orders) allows each spectral channel to update individually
-                if  n<50:
-                    text1.set_text('+1 Order Inst Rate: %.0f counts/s'%(CntRt_p1))
-                    vmin = hist1.min()
-                    vmax = hist1.max()
-                    plot1.set_data(hist1.T)
-                    plot1.autoscale()
-                    plt.pause(.00001)
-                elif time.time() - last_calculation_time >= .75:
-                    text1.set_text('+1 Order Inst Rate: %.0f counts/s'%(CntRt_p1))
-                    vmin = hist1.min()
-                    vmax = hist1.max()
-                    plot1.set_data(hist1.T)
-                    plot1.autoscale()
-                    plt.pause(.00001)
-                    last_calculation_time = time.time()
-                '''
-                # Write to file
-                writer = csv.writer(fp1, delimiter=',')
-                writer.writerows(zip(packetnum,times,X,Y,P,num_photons))
-                fp1.flush() # clear input buffer so file can be written & saved live
-                
-            ###############################################
-            ################## Zero Order #################
-            ###############################################
-            elif address == ('192.168.1.10', 62510):
-                if prev_t0 is not None:
-                    del_t0 = t - prev_t0
-                else:
-                    del_t0 = t
-                prev_t0 = t
-                CntRt_0 = n/del_t0
-                text2.set_text('Zero Order Inst Rate: %.0f counts/s'%(CntRt_0))
-                newhist2,x,y = np.histogram2d(X,Y, bins=[355,355], range=[[1300,13500],[1750,13090]])
-                hist2 = np.add(hist2,newhist2)
-                '''
-                if n<50:
-                    text2.set_text('Zero Order Inst Rate: %.0f counts/s'%(CntRt_0))
-                    vmin = hist2.min()
-                    vmax = hist2.max()
-                    plot2.set_data(hist2.T)
-                    plot2.autoscale()
-                    plt.pause(0.00001)
-                elif time.time() - last_calculation_time >= 0.75:
-                    text2.set_text('Zero Order Inst Rate: %.0f counts/s'%(CntRt_0))
-                    vmin = hist2.min()
-                    vmax = hist2.max()
-                    plot2.set_data(hist2.T)
-                    plot2.autoscale()
-                    plt.pause(0.00001)
-                    last_calculation_time = time.time()
-                '''
-                # Write to file
-                writer = csv.writer(f0, delimiter=',')
-                writer.writerows(zip(packetnum,times,X,Y,P,num_photons))
-                f0.flush()
-                
-            ##############################################
-            ################ -1 Order (90°) ##############
-            ##############################################
-            elif address == ('192.168.1.12', 62510):
-                if prev_tn1 is not None:
-                    del_tn1 = t - prev_tn1
-                else:
-                    del_tn1 = t
-                prev_tn1 = t
-                CntRt_n1 = n/del_tn1
-                text3.set_text('-1 Order Inst Rate: %.0f counts/s'%(CntRt_n1))
-                newhist3,x,y = np.histogram2d(X,Y, bins=[355,355], range=[[1900,13400],[2100,13090]])
-                hist3 = np.add(hist3,newhist3)
-                '''
-                if n<50:
-                    text3.set_text('-1 Order Inst Rate: %.0f counts/s'%(CntRt_n1))
-                    vmin = hist3.min()
-                    vmax = hist3.max()
-                    plot3.set_data(hist3.T)
-                    plot3.autoscale()
-                    plt.pause(0.00001)
-                elif time.time() - last_calculation_time >= 0.75:
-                    text3.set_text('-1 Order Inst Rate: %.0f counts/s'%(CntRt_n1))
-                    vmin = hist3.min()
-                    vmax = hist3.max()
-                    plot3.set_data(hist3.T)
-                    plot3.autoscale()
-                    plt.pause(0.00001)
-                    last_calculation_time = time.time()
-                '''
-                # Write to file
-                writer = csv.writer(fn1, delimiter=',')
-                writer.writerows(zip(packetnum,times,X,Y,P,num_photons))
-                fn1.flush()
-            else:
-                print(address)
+
+    ######################################################################################
+    ##################### ---- Initial Socket and Plot Settings ---- #####################
+    ######################################################################################
+
+    ## ---- Create A Socket (or one per --listen address) ---- ##
+    #TDCs are set to send packets to this ip,port combo
+    ip = ''     #open to broadcast ip='' and adapter set to 192.168.1.2 -- for unicast set ip='192.168.1.100' and same for adapter
+    port = 60000
+    socks = []
+    for server_address in args.listen or registry.listen or [(ip, port)]:
+        s, granted = open_socket(server_address, args.rcvbuf, args.rxq_ovfl)
+        socks.append(s)
+        print(color.BOLD + "Socket created for: ", s.getsockname(), color.END + " receive buffer %d KB"%(granted >> 10)) #check ip and port being used
+        if args.rcvbuf and granted < args.rcvbuf:
+            print(color.YELLOW + 'Asked for a %d KB receive buffer but the kernel only allows %d KB - raise it with "sudo sysctl -w net.core.rmem_max=%d"'%(args.rcvbuf >> 10, granted >> 10, args.rcvbuf) + color.END)
+    kernel = KernelDropMonitor(socks) # drops in the kernel (buffer full), as opposed to packets that never arrived
+    print(color.BLUE + '####### Server is listening' + color.DARKCYAN + ' ... wait for next message #######' + color.END)
+
+    ## ---- Start The Live Plot Window In Its Own Process ---- ##
+    display_queue = multiprocessing.Queue(maxsize=2)
+    display_queue.cancel_join_thread() # never hang on exit waiting for the window to take a snapshot it no longer needs
+    replies = multiprocessing.Queue(maxsize=16) # zoomed regions and frame times coming back from the window
+    display_stop = multiprocessing.Event() # set on the way out, the window ignores ^C itself
+    display = multiprocessing.Process(target=run_display, args=(display_queue, registry.sources, t_int, replies, args.display_load, display_stop), daemon=True)
+    display.start()
+
+
+
+
+    ######################################################################################
+    ######### ---- Receive Data In A 'Forever Loop' And Write To Files ---- ##########
+    ######################################################################################
+    ring = PacketRing(args.ring, registry.index, rxq_ovfl=args.rxq_ovfl)
+    base_t = time.time()
+    last_calculation_time = base_t
+    meters = [RateMeter(window=args.rate_window) for src in registry] # sliding window + smoothed count rates (see OAxFORTIS_rates.py)
+    rates = [None] * nsrc
+    live = LivePublisher(registry.sources, args.shm) if args.shm else None # histograms + counters for other viewers
+    hists = [OrderAccumulator(src.range, pyramid=True, out=live.buffers(k) if live else None) for k, src in enumerate(registry)] # 2D image + zoom pyramid, X/Y projections & pulse heights, updated in place
+    views = [None] * nsrc # region each panel is zoomed to (None = whole order)
+    shown = [None] * nsrc # (histogram version, region) the window last got for each panel, so unchanged panels aren't resent
+    dropped_updates = 0
+    hasprinted = False
+    # packet number gaps/duplicates/reorders and jitter per TDC, plus how long decoding and writing take per batch
+    trackers = [SequenceTracker() for src in registry]
+    decode_time = LatencyHistogram()
+    hist_time = LatencyHistogram()
+    write_time = LatencyHistogram()
+    draw_time = LatencyHistogram()
+    unknown_packets = 0
+    batch_size = 0
+    metrics = MetricsServer(args.metrics) if args.metrics else None
+    if metrics:
+        print(color.BOLD + 'Metrics at http://%s:%d/metrics'%metrics.address + color.END)
+    prev_packets = [0] * nsrc
+    prev_metrics_time = time.time()
+    last_status_time = time.time()
+    footer = ''
+
+
+    # output is flushed in groups (see OAxFORTIS_writers.py), and always flushed + synced on the way out (^C or kill)
+    if args.rotate_mb or args.rotate_min:
+        files = [GroupCommitWriter(SegmentedSink("./{}/{}_{}".format(today,src.order,modifier), 'evt' if args.binary else 'csv',
+                                                 args.rotate_mb and int(args.rotate_mb*1e6), args.rotate_min and 60*args.rotate_min, summary=True), policy) for src in registry]
+    elif args.binary:
+        files = [GroupCommitWriter(EventStore("./{}/{}_{}".format(today,src.order,modifier), summary=True), policy) for src in registry]
+    else:
+        files = [GroupCommitWriter(CsvSink("./{}/{}_{}.csv".format(today,src.order,modifier), delimiter=',', summary=True), policy) for src in registry]
+    # source number in the packet summaries: 0 Zero, 1 Pos1, 2 Neg1 (as the VIM's tdc_N folders), anything else after those
+    source_numbers = [ORDERS.index(src.order) if src.order in ORDERS else len(ORDERS) + k for k, src in enumerate(registry)]
+    journal = GroupCommitWriter(JournalSink("./{}/raw_{}".format(today,modifier)), policy) if args.journal else None
+    stop_on_signals()
+    wait = min(t_int, policy.timeout() or t_int)
+    try:
+        while True:
+            # pull every packet waiting on the socket into the ring, then handle them as one batch
+            batch = ring.drain(socks, timeout=wait)
+            if batch.stop > batch.start and not hasprinted:
+                print(color.PURPLE + '####### Server has begun receiving packets #######' + color.END)
+                hasprinted = True
+
+            if journal is not None:
+                journal.write((ring, batch), packets=batch.stop - batch.start)
+            packets = ring.packets(batch)
+            source = ring.source[batch]
+            times = ring.times[batch] - base_t # Packet Time Stamps
+            batch_size = batch.stop - batch.start
+            for i in np.flatnonzero(source < 0):
+                print(ring.addresses[batch.start + i])
+                unknown_packets += 1
+
+            for k in range(nsrc):
+                mine = source == k
+                if not mine.any():
+                    continue
+                trackers[k].update(packets['packetnum'][mine], ring.mono[batch][mine])
+                # only want real events and no duplicate events (packets with more than one event)
+                t0 = time.perf_counter()
+                rows = expand_events(packets[mine], times[mine], min_events=2)
+                t1 = time.perf_counter()
+                decode_time.add(t1 - t0)
+                n = packets['n'][mine]
+                meters[k].add(times[mine], np.minimum(n, MAX_EVENTS) * (n >= 2)) # empty packets count too - the rate drops to 0
+                rates[k] = meters[k].rate()
+
+                # Write to file (packets without events too, they only go in the packet summary)
+                files[k].write(rows, packets=np.count_nonzero(mine), summary=packet_summary(packets[mine], times[mine], source_numbers[k], min_events=2))
+                write_time.add(time.perf_counter() - t1)
+                if len(rows) == 0:
+                    continue
+                t2 = time.perf_counter()
+                if live:
+                    live.begin()
+                hists[k].add(rows['X'], rows['Y'], rows['P'])
+                if live:
+                    live.orders['events'][k] = hists[k].events
+                    live.end()
+                hist_time.add(time.perf_counter() - t2)
+
+            for f in files + ([journal] if journal is not None else []):
+                f.poll() # time based flushing, so tail -f stays live when packets are slow
+
+            ##################################################################
+            ########### Hand the live window a snapshot to draw ##############
+            ##################################################################
+            try:
+                while True:
+                    message = replies.get_nowait()
+                    if message[0] == 'view':
+                        _, k, views[k] = message
+                        last_calculation_time = 0 # answer a zoom right away
+                    elif message[0] == 'render':
+                        draw_time.add(message[1])
+            except queue.Empty:
                 pass
-            
-            #######################################################################
-            ########### Update plotting for each channel simultaneously ###########
-            #######################################################################
-            t_int = 0.75
-            if  time.time() - last_calculation_time >= t_int:
-                if len(newhist1) > 1:
-                    vmin = hist1.min()
-                    vmax = hist1.max()
-                    plot1.set_data(hist1.T)
-                    plot1.autoscale()
-                
-                if len(newhist2) > 1:
-                    vmin = hist2.min()
-                    vmax = hist2.max()
-                    plot2.set_data(hist2.T)
-                    plot2.autoscale()
-                
-                if len(newhist3) > 1:
-                    vmin = hist3.min()
-                    vmax = hist3.max()
-                    plot3.set_data(hist3.T)
-                    plot3.autoscale()
-                
+            if time.time() - last_calculation_time >= t_int:
+                status = [tr.summary() if tr.packets else None for tr in trackers]
+                kernel_drops = max(kernel.poll(), sum(ring.overflows.values()))
+                if live:
+                    live.begin()
+                    live.orders['rate'] = [r or 0 for r in rates]
+                    live.orders['ewma'] = [m.ewma for m in meters]
+                    live.orders['packets'] = [tr.packets for tr in trackers]
+                    live.orders['missing'] = [tr.missing for tr in trackers]
+                    live.orders['kernel_drops'] = kernel_drops
+                    live.end()
+                footer = 'decode p50 %.2fms p99 %.2fms | write p50 %.2fms p99 %.2fms | %d display updates dropped | kernel drops %d, %d KB queued'%(
+                    1e3*decode_time.percentile(50), 1e3*decode_time.percentile(99), 1e3*write_time.percentile(50), 1e3*write_time.percentile(99), dropped_updates,
+                    kernel_drops, sum(kernel.queued) >> 10)
+                # rates and footer go out every time once there's data, a panel's image only when its histogram (version) or zoom changed
+                latest = [(h.version, v) for h,v in zip(hists,views)]
+                if any(h.version for h in hists):
+                    if send_update(display_queue, [h.view(v) if h.version and old != new else None for h,v,old,new in zip(hists,views,shown,latest)], rates, status, footer):
+                        shown = latest
+                    else:
+                        dropped_updates += 1 # display is behind, it'll get the next snapshot instead
                 last_calculation_time = time.time()
-                plt.pause(.000001)
 
+                ## ---- Metrics for anyone watching from another terminal ---- ##
+                if metrics:
+                    m = Metrics()
+                    dt = max(last_calculation_time - prev_metrics_time, 1e-9)
+                    for k, src in enumerate(registry):
+                        m.add('oaxfortis_packets_total', 'counter', 'Packets received from each TDC', trackers[k].packets, order=src.order)
+                        m.add('oaxfortis_packets_per_second', 'gauge', 'Packet rate since the last update', (trackers[k].packets - prev_packets[k])/dt, order=src.order)
+                        m.add('oaxfortis_events_total', 'counter', 'Events written', hists[k].events, order=src.order)
+                        m.add('oaxfortis_events_per_second', 'gauge', 'Event rate over the live rate window', rates[k] or 0, order=src.order)
+                        m.add('oaxfortis_events_per_second_smoothed', 'gauge', 'Event rate, EWMA', meters[k].ewma, order=src.order)
+                        m.add('oaxfortis_bytes_written_total', 'counter', 'Bytes written to each output file', files[k].bytes_written, file=src.order)
+                        m.add('oaxfortis_writer_pending_bytes', 'gauge', 'Bytes written but not flushed yet', files[k].pending_bytes, file=src.order)
+                        m.add('oaxfortis_packets_missing', 'gauge', 'Packets missing from the sequence numbers', trackers[k].missing, order=src.order)
+                        m.add('oaxfortis_sequence_gaps_total', 'counter', 'Gaps in the sequence numbers', trackers[k].gaps, order=src.order)
+                        m.add('oaxfortis_packets_duplicate_total', 'counter', 'Duplicated packets', trackers[k].duplicates, order=src.order)
+                        m.add('oaxfortis_packets_reordered_total', 'counter', 'Packets that arrived late', trackers[k].reordered, order=src.order)
+                        m.add('oaxfortis_jitter_seconds', 'gauge', 'Packet arrival jitter (RFC 3550)', trackers[k].jitter, order=src.order)
+                        prev_packets[k] = trackers[k].packets
+                    if journal is not None:
+                        m.add('oaxfortis_bytes_written_total', 'counter', 'Bytes written to each output file', journal.bytes_written, file='journal')
+                    for stage, hist in (('decode', decode_time), ('histogram', hist_time), ('write', write_time), ('draw', draw_time)):
+                        m.summary('oaxfortis_stage_seconds', 'Time per batch spent in each stage (draw = one live window frame)', hist, stage=stage)
+                    m.add('oaxfortis_kernel_drops_total', 'counter', 'Packets dropped by the kernel because a receive buffer was full', kernel_drops)
+                    m.add('oaxfortis_socket_queued_bytes', 'gauge', 'Bytes waiting in the socket receive buffers', sum(kernel.queued))
+                    m.add('oaxfortis_ring_batch_packets', 'gauge', 'Packets read in the last batch', batch_size)
+                    m.add('oaxfortis_ring_slots', 'gauge', 'Packet slots in the receive ring', ring.slots)
+                    try:
+                        m.add('oaxfortis_display_queue_depth', 'gauge', 'Snapshots waiting for the live window', display_queue.qsize())
+                    except NotImplementedError: # macOS
+                        pass
+                    m.add('oaxfortis_display_updates_dropped_total', 'counter', 'Snapshots skipped because the live window was behind', dropped_updates)
+                    m.add('oaxfortis_unknown_packets_total', 'counter', 'Packets from addresses not in the source table', unknown_packets)
+                    metrics.publish(m)
+                    prev_metrics_time = last_calculation_time
+
+            ## ---- Receive path health in the terminal ---- ##
+            if args.status and time.time() - last_status_time >= args.status:
+                for k in range(nsrc):
+                    if trackers[k].packets:
+                        print(color.BOLD + '%-10s'%registry[k].label + color.END + ' %.0f counts/s (smoothed %.0f), %d packets, '%(rates[k] or 0, meters[k].ewma, trackers[k].packets) + trackers[k].summary())
+                print(color.DARKCYAN + footer + color.END)
+                last_status_time = time.time()
+    except KeyboardInterrupt: # ^C or kill, see stop_on_signals
+        print(color.BLUE + '####### Stopping, closing files #######' + color.END)
+    finally:
+        display_stop.set()
+        for f in files + ([journal] if journal is not None else []):
+            f.close()
+        if live:
+            live.close()
+        if metrics:
+            metrics.close()
+        display.join(timeout=t_int + 1)
@@ -0,0 +1,79 @@
+'''
+Created: 10/18/2026
+
+Shared decoder for OAxFORTIS TDC packets, used by OAxFORTIS_datacollect.py, OAxFORTIS_Server.py and OAxFORTIS_VIM2CSV.py
+so every entry point reads packets the same way.
+
+UDP Packet format: (see TDC manual for byte structure of packets)
+- 1458 total bytes in each packet = 729 little endian 16-bit words
+- first 3 words are num photons, packet num, 0
+- next 726 words are X coordinate, Y coordinate, and pulse height repeating (max of 242 events)
+
+Packets are read with np.frombuffer(..., '<u2'), so the X/Y/P columns returned are views into the received bytes - nothing
+is copied until events are actually written out. Words are read as plain unsigned integers, so values in 0xD800-0xDFFF come
+through untouched (the old data.decode('utf-16-le', errors='replace') turned those lone surrogates into 0xFFFD).
+'''
+
+import numpy as np
+
+PACKET_BYTES = 1458
+PACKET_WORDS = PACKET_BYTES // 2
+HEADER_WORDS = 3
+MAX_EVENTS = (PACKET_WORDS - HEADER_WORDS) // 3
+
+EVENT_DTYPE = np.dtype([('X', '<u2'), ('Y', '<u2'), ('P', '<u2')])
+PACKET_DTYPE = np.dtype([('n', '<u2'), ('packetnum', '<u2'), ('spare', '<u2'), ('events', EVENT_DTYPE, (MAX_EVENTS,))])
+
+# one row per event, same column order as the Zero/Pos1/Neg1 csv files
+ROW_DTYPE = np.dtype([('packetnum', '<u2'), ('time', '<f8'), ('X', '<u2'), ('Y', '<u2'), ('P', '<u2'), ('n', '<u2')])
+
+
+def packet_words(data):
+    '''View a single packet (bytes, bytearray, memoryview or an integer array) as little endian 16-bit words.'''
+    if isinstance(data, np.ndarray):
+        return data.astype('<u2', copy=False)
+    return np.frombuffer(data, dtype='<u2', count=len(data) // 2)
+
+
+def decode_packet(data):
+    '''
+    Decode one packet. Returns (n, packetnum, X, Y, P) where n is the number of events the TDC reported and X/Y/P are
+    views of the first n events (filler past n is already dropped).
+    '''
+    words = packet_words(data)
+    n = int(words[0])
+    packetnum = int(words[1])
+    X = words[HEADER_WORDS::3][:n]
+    Y = words[HEADER_WORDS+1::3][:n]
+    P = words[HEADER_WORDS+2::3][:n]
+    return n, packetnum, X, Y, P
+
+
+def decode_batch(buf, count=-1):
+    '''
+    View a contiguous run of 1458-byte packets as one structured array (one record per packet, fields n, packetnum, spare
+    and events[X,Y,P]). No copy is made, so buf must stay alive and unchanged while the result is in use.
+    '''
+    return np.frombuffer(buf, dtype=PACKET_DTYPE, count=count)
+
+
+def expand_events(packets, times, min_events=1):
+    '''
+    Flatten the real events of a batch of packets into one ROW_DTYPE array, in a single vectorized pass.
+    times holds one time stamp per packet. Packets reporting fewer than min_events events are skipped
+    (datacollect and VIM2CSV skip single-event packets, i.e. min_events=2).
+    '''
+    n = packets['n'].astype(np.intp)
+    keep = n >= min_events
+    used = np.minimum(n, MAX_EVENTS) * keep
+    mask = np.arange(MAX_EVENTS) < used[:, None]
+
+    rows = np.empty(int(used.sum()), dtype=ROW_DTYPE)
+    events = packets['events'][mask]
+    rows['X'] = events['X']
+    rows['Y'] = events['Y']
+    rows['P'] = events['P']
+    rows['packetnum'] = np.repeat(packets['packetnum'], used)
+    rows['time'] = np.repeat(np.asarray(times, dtype='<f8'), used)
+    rows['n'] = np.repeat(packets['n'], used)
+    return rows
@@ -0,0 +1,175 @@
+'''
+Created: 10/18/2026
+
+Live plot window for OAxFORTIS_datacollect.py. It runs in its own process (run_display) so matplotlib redraws never hold up
+packet intake in the receiver.
+
+The receiver hands over snapshots of the three accumulated order histograms and their instantaneous count rates through a
+small bounded queue (send_update). Every snapshot carries the whole histogram, so when this window can't keep up the receiver
+simply skips sending and the next snapshot catches the display back up - display updates get dropped, packets never do.
+
+Zooming or panning a panel with the toolbar sends the new region back to the receiver (replies), which answers straight
+away with that region cut from its image pyramid (OAxFORTIS_hist.DetectorPyramid) at the binning that suits the window, down
+to single detector pixels. The home button goes back to the usual whole order histogram.
+
+Redraws are blitted: the axes, ticks and titles are drawn once, and each frame only redraws the image of a panel that got
+new data plus the rate/status text. Frames are at most one per t_int seconds, and further apart if drawing would otherwise
+take more than max_load of the time. The time the last frame took to draw is shown at the end of the footer.
+'''
+
+import time
+import queue
+import signal
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib
+from matplotlib import colors
+from matplotlib.transforms import Bbox
+matplotlib.rcParams.update({'font.size': 8})
+
+def send_update(q, hists, rates, status=None, footer=''):
+    '''
+    Offer a snapshot to the display without ever blocking. hists/rates/status are lists with one entry per order (None for
+    orders that haven't seen data yet) - hists entries are (image indexed [y, x], extent), status is a line of packet loss/jitter info shown under each rate. footer is a line
+    of receive path timings for the bottom of the window. Returns False if the display is behind and the update was dropped.
+    '''
+    try:
+        q.put_nowait((hists, rates, status or [None] * len(hists), footer))
+        return True
+    except queue.Full:
+        return False
+
+
+def reply(q, *message):
+    '''
+    Send a message back to the receiver without ever blocking (False if it was dropped):
+        ('view', k, roi)     show panel k cropped to roi = (xlo, xhi, ylo, yhi), or the whole histogram if roi is None
+        ('render', seconds)  how long the last frame took to draw
+    '''
+    try:
+        q.put_nowait(message)
+        return True
+    except queue.Full:
+        return False
+
+
+def run_display(q, panels, t_int=0.75, replies=None, max_load=0.25, stop=None):
+    '''
+    Process target: build the live window and redraw it with the newest snapshot at most every t_int seconds until it's
+    closed. panels is the list of OAxFORTIS_registry.Source entries, in the same order as the snapshot lists. The first one is
+    drawn on the right (for the flight table that reads -1, 0, +1 left to right). Zoomed regions and frame times are sent
+    back on replies if given (see reply). max_load is the largest fraction of the time the window may spend drawing - if
+    frames take longer than that allows, they are spaced out further. The window closes itself once the stop event (if
+    given) is set. ^C is left to the receiver, which sets stop on its way out.
+    '''
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # the terminal's ^C reaches this process too
+
+    ## ---- Initiate Empty Plots ---- ##
+    npanel = len(panels)
+    gs_kw = dict(width_ratios=[src.width for src in panels[::-1]], height_ratios=[1,1] )
+    fig, axes = plt.subplots(nrows=2, ncols=npanel, sharey=True, gridspec_kw=gs_kw, figsize=(16,7), squeeze=False)
+    fig.subplots_adjust(hspace=.075,wspace=0)
+    canvas = fig.canvas
+
+    vmin = 1000 #arbitrary so imshow doesn't yell at me :(
+    vmax = 10000
+    plots = []
+    texts = []
+    zoomed = set() # panels whose axes limits changed since the last look
+    for k, src in enumerate(panels):
+        XY, txt = axes[0][npanel-1-k], axes[1][npanel-1-k]
+        XY.set_title(src.title)
+        txt.axis('off')
+        # animated artists are left out of full redraws and drawn on their own (blitted) when they change
+        plots.append(XY.imshow(np.zeros((10, 10)), interpolation='nearest', cmap='magma', norm=colors.LogNorm(vmin=vmin,vmax=vmax), origin='lower', extent=src.extent, aspect='auto', animated=True))
+        if src.flip_x:
+            XY.invert_xaxis()
+        texts.append(XY.text(0.1,-0.2,'', fontsize=10, weight="bold", transform=XY.transAxes, animated=True))
+        if replies is not None:
+            XY.callbacks.connect('xlim_changed', lambda ax, k=k: zoomed.add(k))
+            XY.callbacks.connect('ylim_changed', lambda ax, k=k: zoomed.add(k))
+    footer_text = fig.text(0.5, 0.02, '', ha='center', fontsize=8, animated=True)
+    texts.append(footer_text)
+
+    ## ---- Blitting ---- ##
+    # After every full redraw (first show, resize, zoom...) save what's behind the animated artists: each image panel, and
+    # the strip below them holding all the text. A frame then only restores and redraws the parts that changed.
+    saved = {}
+    def on_draw(event):
+        saved['images'] = [canvas.copy_from_bbox(p.axes.bbox) for p in plots]
+        saved['text_box'] = Bbox.from_extents(fig.bbox.x0, fig.bbox.y0, fig.bbox.x1, max(ax.bbox.y1 for ax in axes[1]))
+        saved['text'] = canvas.copy_from_bbox(saved['text_box'])
+        for artist in plots + texts:
+            fig.draw_artist(artist)
+    blit = getattr(canvas, 'supports_blit', False)
+    if blit:
+        canvas.mpl_connect('draw_event', on_draw)
+    else:
+        for artist in plots + texts:
+            artist.set_animated(False)
+
+    plt.show(block=False)
+    canvas.draw()
+    zoomed.clear() # the first draw settles the axes limits, that isn't a zoom
+    render_time = 0.
+    next_frame = time.monotonic()
+    while plt.fignum_exists(fig.number):
+        # hand the GUI its events (zooming, resizing...) until the next frame is due
+        canvas.start_event_loop(max(next_frame - time.monotonic(), 0.01))
+        if stop is not None and stop.is_set():
+            plt.close(fig)
+        if not plt.fignum_exists(fig.number):
+            break
+
+        ## ---- Ask the receiver for any zoomed region ---- ##
+        for k in sorted(zoomed):
+            XY = plots[k].axes
+            (xlo, xhi), (ylo, yhi) = sorted(XY.get_xlim()), sorted(XY.get_ylim())
+            home = panels[k].extent
+            whole = xlo <= home[0] + 1 and xhi >= home[1] - 1 and ylo <= home[2] + 1 and yhi >= home[3] - 1
+            reply(replies, 'view', k, None if whole else (float(xlo), float(xhi), float(ylo), float(yhi)))
+        zoomed.clear()
+
+        if time.monotonic() < next_frame:
+            continue
+        # only the newest snapshot matters, skip any older ones still waiting
+        update = None
+        try:
+            while True:
+                update = q.get_nowait()
+        except queue.Empty:
+            pass
+        if update is None:
+            continue
+
+        t0 = time.perf_counter()
+        hists, rates, status, footer = update
+        changed = [] # panels whose image changed
+        for k, src in enumerate(panels):
+            if rates[k] is not None:
+                texts[k].set_text('%s Inst Rate: %.0f counts/s'%(src.label, rates[k]) + ('\n' + status[k] if status[k] else ''))
+            if hists[k] is not None: # None = nothing new for this panel
+                image, extent = hists[k]
+                plots[k].set_data(image)
+                if list(plots[k].get_extent()) != list(extent):
+                    plots[k].set_extent(extent)
+                plots[k].autoscale()
+                changed.append(k)
+        footer_text.set_text(footer + (' | render %.1fms/frame'%(1e3*render_time) if footer else ''))
+
+        if not blit or 'images' not in saved:
+            canvas.draw_idle()
+        else:
+            for k in changed:
+                canvas.restore_region(saved['images'][k])
+                fig.draw_artist(plots[k])
+                canvas.blit(plots[k].axes.bbox)
+            canvas.restore_region(saved['text'])
+            for artist in texts:
+                fig.draw_artist(artist)
+            canvas.blit(saved['text_box'])
+        zoomed.clear() # limit changes from the redraw above aren't zooms
+        render_time = time.perf_counter() - t0
+        if replies is not None:
+            reply(replies, 'render', render_time)
+        next_frame = time.monotonic() + max(t_int, render_time/max_load)
@@ -0,0 +1,323 @@
+'''
+Created: 10/18/2026
+
+Compact binary event store - an alternative to writing every event as a CSV row.
+
+Each order gets two append-only files next to where its CSV would be (e.g. Zero_<modifier>.evt and Zero_<modifier>.pkt):
+    .evt  one 5-byte record per event:   X (uint16), Y (uint16), pulse height (uint8)
+    .pkt  one 24-byte record per packet: packet num (uint16), num photons (uint16), packet time stamp (float64),
+          index of the packet's first event in .evt (uint64), number of events written (uint32)
+Both are plain little endian records with no header, so they can be opened with np.memmap and a partially written file can
+be read (or tail'ed) while collection is running - readers simply ignore a trailing partial record. Events are always written
+before the packet record that points to them.
+
+PACKET SUMMARY: next to every output file (csv or store) datacollect and the VIM conversion also keep <prefix>.pks, one 26-byte
+record (SUMMARY_RECORD) per packet received - including the packets left out of the event file for having fewer than 2 events:
+    packet num (uint16), num photons (uint16), source (uint16: 0 Zero, 1 Pos1, 2 Neg1 - the VIM's tdc_N numbers), receive time
+    stamp (float64), byte offset of the packet's first event in the event file (uint64), number of events written (uint32)
+Rates, packet loss and anything else per packet read only this file (read_summary), so they cost O(packets) rather than a
+pass over every event, and offset seeks straight to a packet's events (for a packet with no events written, to where the
+next one's start). Like the store it is written after the events it points to, and has no header.
+
+The same two record types are also the in-memory form of a run for analysis (EventTable): 5 bytes per event plus 24 per
+packet, instead of 48 bytes per event as a float64 np.loadtxt matrix (16 as ROW_DTYPE rows). A store is opened as an
+EventTable without copying anything (memory mapped), and csv files load into one (OAxFORTIS_load.load_table).
+
+To get the usual Zero/Pos1/Neg1 CSV layout (packet num, time, X, Y, P, num photons) back, run
+                python OAxFORTIS_eventstore.py <data folder> <modifier>
+'''
+
+import os
+import sys
+import csv
+import numpy as np
+from OAxFORTIS_decode import ROW_DTYPE, MAX_EVENTS
+
+EVENT_RECORD = np.dtype([('X', '<u2'), ('Y', '<u2'), ('P', 'u1')])
+PACKET_RECORD = np.dtype([('packetnum', '<u2'), ('n', '<u2'), ('time', '<f8'), ('first', '<u8'), ('count', '<u4')])
+SUMMARY_RECORD = np.dtype([('packetnum', '<u2'), ('n', '<u2'), ('source', '<u2'), ('time', '<f8'), ('offset', '<u8'), ('count', '<u4')])
+SUMMARY_SUFFIX = '.pks'
+CHUNK_EVENTS = 1 << 20 # events per part when going through a table a part at a time
+ORDERS = ['Zero', 'Pos1', 'Neg1']
+
+
+def packet_starts(rows):
+    '''Index of the first row of each packet in a ROW_DTYPE array (a new packet starts wherever packet num or time changes).'''
+    new = np.ones(len(rows), dtype=bool)
+    new[1:] = (rows['packetnum'][1:] != rows['packetnum'][:-1]) | (rows['time'][1:] != rows['time'][:-1])
+    return np.flatnonzero(new)
+
+
+def packet_summary(packets, times, source, min_events=1):
+    '''
+    SUMMARY_RECORD of each packet in a batch (PACKET_DTYPE) with the given time stamps: count is the number of rows
+    OAxFORTIS_decode.expand_events(packets, times, min_events) gives it. The sink writing those rows fills in offset.
+    '''
+    summary = np.zeros(len(packets), dtype=SUMMARY_RECORD)
+    summary['packetnum'] = packets['packetnum']
+    summary['n'] = packets['n']
+    summary['source'] = source
+    summary['time'] = times
+    summary['count'] = np.minimum(packets['n'], MAX_EVENTS) * (packets['n'] >= min_events)
+    return summary
+
+
+def summary_offsets(summary, row_bytes, start):
+    '''Fill in summary['offset'] for rows written from byte start on, row_bytes being the size of each row (in order).'''
+    ends = np.cumsum(row_bytes, dtype=np.uint64)
+    first = np.cumsum(summary['count'].astype(np.intp)) - summary['count'] # each packet's first row
+    summary['offset'] = start + np.append(np.uint64(0), ends)[first]
+    return summary
+
+
+class EventStore:
+    '''
+    Appends ROW_DTYPE rows (see OAxFORTIS_decode.expand_events) to <prefix>.evt / <prefix>.pkt, and with summary=True
+    the batch's packet summary (see packet_summary) to <prefix>.pks.
+    '''
+    def __init__(self, prefix, summary=False):
+        self.prefix = prefix
+        self.fevt = open(prefix + '.evt', 'ab')
+        self.fpkt = open(prefix + '.pkt', 'ab')
+        self.fsum = open(prefix + SUMMARY_SUFFIX, 'ab') if summary else None
+        self.sums = [] # summaries waiting for their events to be flushed
+        self.nevents = self.fevt.tell() // EVENT_RECORD.itemsize # picks up where an earlier run left off
+
+    def write(self, rows, summary=None):
+        if summary is not None and self.fsum is not None:
+            summary_offsets(summary, np.full(len(rows), EVENT_RECORD.itemsize), self.nevents*EVENT_RECORD.itemsize)
+        else:
+            summary = None
+        nbytes = self._write_rows(rows) if len(rows) else 0
+        if summary is not None:
+            self.sums.append(summary)
+            nbytes += summary.nbytes
+        return nbytes
+
+    def _write_rows(self, rows):
+        events = np.empty(len(rows), dtype=EVENT_RECORD)
+        events['X'] = rows['X']
+        events['Y'] = rows['Y']
+        events['P'] = np.minimum(rows['P'], 255) #max pulse height is 255
+
+        starts = packet_starts(rows)
+        packets = np.empty(len(starts), dtype=PACKET_RECORD)
+        packets['packetnum'] = rows['packetnum'][starts]
+        packets['n'] = rows['n'][starts]
+        packets['time'] = rows['time'][starts]
+        packets['first'] = self.nevents + starts
+        packets['count'] = np.diff(np.append(starts, len(rows)))
+
+        self.fevt.write(events.tobytes())
+        self.fpkt.write(packets.tobytes())
+        self.nevents += len(rows)
+        return events.nbytes + packets.nbytes
+
+    def flush(self):
+        self.fevt.flush() # events first, so a packet record never points past the end of .evt
+        self.fpkt.flush()
+        if self.sums: # only once the events they point to are in the file
+            self.fsum.write(b''.join(summary.tobytes() for summary in self.sums))
+            self.fsum.flush()
+            self.sums = []
+
+    def sync(self):
+        for f in (self.fevt, self.fpkt, self.fsum):
+            if f is not None:
+                os.fsync(f.fileno())
+
+    def close(self):
+        self.flush()
+        self.fevt.close()
+        self.fpkt.close()
+        if self.fsum is not None:
+            self.fsum.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _map(path, dtype):
+    count = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+def open_store(prefix):
+    '''Memory map (events, packets) of a store. Only complete records are mapped, so this is safe on a file being written.'''
+    events = _map(prefix + '.evt', EVENT_RECORD)
+    packets = _map(prefix + '.pkt', PACKET_RECORD)
+    # drop packets whose events haven't landed yet
+    packets = packets[packets['first'] + packets['count'] <= len(events)] if len(packets) else packets
+    return events, packets
+
+
+def join_packets(parts):
+    '''
+    PACKET_RECORD arrays of consecutive parts of a run (each counting first from its own events) as one for the whole run
+    (a packet split between two parts is joined back together).
+    '''
+    packets = []
+    nevents = 0
+    for part in parts:
+        if len(part) == 0:
+            continue
+        p = part.copy()
+        p['first'] = p['first'] - part['first'][0] + nevents
+        if packets and packets[-1]['packetnum'][-1] == p['packetnum'][0] and packets[-1]['time'][-1] == p['time'][0]:
+            packets[-1]['count'][-1] += p['count'][0]
+            p = p[1:]
+        if len(p):
+            packets.append(p)
+        nevents += int(part['count'].sum())
+    return np.concatenate(packets) if packets else np.zeros(0, dtype=PACKET_RECORD)
+
+
+def read_summary(prefix):
+    '''
+    SUMMARY_RECORD of every packet written to prefix (memory mapped, complete records only), up to the last one whose events
+    are in prefix.evt (or prefix.csv) - after a crash the summary can be ahead of the event file it points into.
+    '''
+    summary = _map(prefix + SUMMARY_SUFFIX, SUMMARY_RECORD)
+    if os.path.exists(prefix + '.evt'):
+        ends = summary['offset'] + summary['count'].astype(np.uint64)*EVENT_RECORD.itemsize
+        size = os.path.getsize(prefix + '.evt')
+    elif os.path.exists(prefix + '.csv'):
+        ends = summary['offset'] + (summary['count'] > 0) # rows vary in length, so just the first byte of the first one
+        size = os.path.getsize(prefix + '.csv')
+    else:
+        return summary
+    return summary[:np.searchsorted(ends, size, side='right')] # offsets only go up, so the missing ones are all at the end
+
+
+class EventTable:
+    '''
+    A run (or part of one) in memory: events (EVENT_RECORD - X, Y, pulse height) and packets (PACKET_RECORD - packet num,
+    num photons, time stamp, and the first event / number of events in events that belong to it).
+    '''
+    def __init__(self, events=None, packets=None):
+        self.events = np.zeros(0, dtype=EVENT_RECORD) if events is None else events
+        self.packets = np.zeros(0, dtype=PACKET_RECORD) if packets is None else packets
+
+    @classmethod
+    def open(cls, prefix):
+        '''A binary store, memory mapped (without any events written after the last complete packet record).'''
+        events, packets = open_store(prefix)
+        end = int(packets['first'][-1] + packets['count'][-1]) if len(packets) else 0
+        return cls(events[:end], packets)
+
+    @classmethod
+    def from_rows(cls, rows):
+        '''From ROW_DTYPE rows (a new packet wherever packet num or time changes).'''
+        events = np.empty(len(rows), dtype=EVENT_RECORD)
+        events['X'] = rows['X']
+        events['Y'] = rows['Y']
+        events['P'] = np.minimum(rows['P'], 255) #max pulse height is 255
+        starts = packet_starts(rows)
+        packets = np.empty(len(starts), dtype=PACKET_RECORD)
+        packets['packetnum'] = rows['packetnum'][starts]
+        packets['n'] = rows['n'][starts]
+        packets['time'] = rows['time'][starts]
+        packets['first'] = starts
+        packets['count'] = np.diff(np.append(starts, len(rows)))
+        return cls(events, packets)
+
+    @classmethod
+    def concatenate(cls, tables):
+        '''Tables of consecutive parts of a run as one (a packet split between two parts is joined back together).'''
+        tables = [t for t in tables if len(t.packets)]
+        if not tables:
+            return cls()
+        events = np.concatenate([t.events[t.packets['first'][0]:t.packets['first'][-1] + t.packets['count'][-1]] for t in tables])
+        return cls(events, join_packets([t.packets for t in tables]))
+
+    def chunks(self, events=CHUNK_EVENTS):
+        '''
+        Consecutive parts of the table holding about events events each (whole packets), for going through a run a part
+        at a time. Events are views of this table's, so nothing of a memory mapped table is read until it's used.
+        '''
+        counts = self.packets['count'].astype(np.int64)
+        ends = np.cumsum(counts)
+        start = 0
+        while start < len(self.packets):
+            stop = max(int(np.searchsorted(ends, ends[start] - counts[start] + events, side='right')), start + 1)
+            packets = self.packets[start:stop].copy()
+            first = int(packets['first'][0])
+            packets['first'] -= first
+            yield EventTable(self.events[first:first + int(counts[start:stop].sum())], packets)
+            start = stop
+
+    def between(self, t0=None, t1=None):
+        '''Only the packets time stamped in [t0, t1] (None = open ended) and their events.'''
+        keep = np.ones(len(self.packets), dtype=bool)
+        if t0 is not None:
+            keep &= self.packets['time'] >= t0
+        if t1 is not None:
+            keep &= self.packets['time'] <= t1
+        if keep.all():
+            return self
+        return EventTable.from_rows(self.rows()[np.repeat(keep, self.packets['count'].astype(np.intp))])
+
+    def __len__(self):
+        return len(self.events)
+
+    def packet_index(self):
+        '''Index into packets of every event.'''
+        return np.repeat(np.arange(len(self.packets)), self.packets['count'].astype(np.intp))
+
+    def hits(self):
+        '''Events with a non-zero pulse height (what the plots histogram).'''
+        return self.events[self.events['P'] != 0]
+
+    def rows(self):
+        '''One ROW_DTYPE row per event (same columns as the CSV files).'''
+        counts = self.packets['count'].astype(np.intp)
+        rows = np.empty(int(counts.sum()), dtype=ROW_DTYPE)
+        if len(self.packets) and len(rows):
+            index = np.repeat(self.packets['first'].astype(np.intp) - np.cumsum(counts) + counts, counts) + np.arange(len(rows))
+            ev = self.events[index]
+            rows['X'] = ev['X']
+            rows['Y'] = ev['Y']
+            rows['P'] = ev['P']
+        rows['packetnum'] = np.repeat(self.packets['packetnum'], counts)
+        rows['time'] = np.repeat(self.packets['time'], counts)
+        rows['n'] = np.repeat(self.packets['n'], counts)
+        return rows
+
+
+def read_rows(prefix):
+    '''Expand a store back into one ROW_DTYPE row per event (same columns as the CSV files).'''
+    return EventTable.open(prefix).rows()
+
+
+def read_table(prefix):
+    '''Same float64 matrix np.loadtxt gives for the CSV (columns: packet num, time, X, Y, P, num photons).'''
+    rows = read_rows(prefix)
+    return np.column_stack([rows[name].astype(float) for name in ROW_DTYPE.names])
+
+
+def to_csv(prefix, csvfile, delimiter=','):
+    '''Write a store out in the Zero/Pos1/Neg1 CSV layout written by OAxFORTIS_datacollect.py.'''
+    rows = read_rows(prefix)
+    with open(csvfile, 'w') as f:
+        writer = csv.writer(f, delimiter=delimiter)
+        writer.writerows(rows.tolist())
+    return len(rows)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Run like : python3 OAxFORTIS_eventstore.py <arg1:data folder (ex: 2024-03-09)> <arg2:filename modifier used to run datacollect>")
+        exit(1)
+    folder, modifier = sys.argv[1], sys.argv[2]
+    for order in ORDERS:
+        prefix = os.path.join(folder, '{}_{}'.format(order, modifier))
+        if os.path.exists(prefix + '.csv'):
+            print('{}.csv already exists, skipping'.format(prefix))
+        elif os.path.exists(prefix + '.evt'):
+            n = to_csv(prefix, prefix + '.csv')
+            print('{}.csv: {} events'.format(prefix, n))
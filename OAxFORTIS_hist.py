@@ -0,0 +1,292 @@
+'''
+Created: 10/18/2026
+
+Incremental histograms for one spectral order, used for the live display in OAxFORTIS_datacollect.py and, after a run, for
+the plots (PlotHistograms below).
+
+Instead of calling np.histogram2d for every packet (a fresh 355x355 float64 array plus edges each time) and adding it into a
+running total, an OrderAccumulator keeps zero-initialized integer grids and adds each batch of events into them in place:
+    grid    2D X/Y image (default 355x355 over the order's range)
+    xproj   X projection (default 1000 bins over the same X range)
+    yproj   Y projection (default 1000 bins over the same Y range)
+    ph      pulse height histogram, one bin per value 0-255
+Coordinates are 16-bit integers, so the bin of every possible value is worked out once up front (a 65536 entry lookup
+table per axis) and binning an event is just a table lookup. Bins match np.histogram2d with the same range (right edge
+included in the last bin, anything outside the range dropped).
+
+DetectorPyramid keeps the same events at every power-of-two binning of the full 14-bit detector, 16384x16384 pixels down to
+64x64, so a zoom or crop of the live image can be served straight from the level whose bins best match the screen instead of
+re-binning raw events. Each level is updated as events arrive. Levels up to 2048x2048 are dense count images (about 22MB per
+order all together); the finer ones would be far too big to hold densely (16384^2 counts is 1GB) and are mostly empty, so they
+are served from full resolution counts kept per 256x256 pixel tile, allocated when a tile is first hit: a sorted table of
+(pixel, count) pairs, or a plain count image once a quarter of the tile's pixels are hit. New events wait in a small per tile
+buffer and each add merges about as many as came in from the fullest tiles, so adding and zooming cost the same one tile at a
+time however long the run gets, and a zoom only reads the tiles it covers.
+
+PlotHistograms holds what the post-run plots (OAxFORTISplots.py, OAxFORTIS_VIM2CSV.py) draw for one order - the X/Y image,
+the two X projections and the pulse heights - filled the same way, a chunk of events at a time. A run is read once, chunk by
+chunk, and every histogram is updated from the same chunk, so plotting takes the same memory for a ten minute run as for a
+ten hour one. Bins are the ones np.histogram2d/np.histogram give with the same bins and range.
+'''
+
+import numpy as np
+
+COORD_VALUES = 1 << 16
+PH_BINS = 256
+FULL_BITS = 14 # detector coordinates are 14 bits, 0-16383
+TILE_BITS = 8 # the finest pyramid levels are kept in tiles of 256x256 detector pixels
+TILE_PENDING = 2048 # events waiting per tile before they're merged into its table
+PH_EDGES = np.arange(10, 260, 10) # pulse height bins of the plots, max pulse height is 255
+
+
+def edge_lookup(edges):
+    '''Bin index of every possible 16-bit value for the bins between edges (-1 = outside, last edge in the last bin).'''
+    values = np.arange(COORD_VALUES)
+    lut = np.searchsorted(edges, values, side='right') - 1
+    lut[values == edges[-1]] = len(edges) - 2
+    lut[(values < edges[0]) | (values > edges[-1])] = -1
+    return lut.astype(np.int32)
+
+
+def bin_lookup(lo, hi, nbins):
+    '''Bin index of every possible 16-bit value for nbins equal bins over [lo, hi] (-1 = outside).'''
+    return edge_lookup(np.linspace(lo, hi, nbins + 1))
+
+
+class OrderAccumulator:
+    def __init__(self, range, bins=(355,355), proj_bins=1000, dtype=np.uint32, pyramid=False, out=None):
+        '''out: optional dict of zeroed arrays to accumulate grid/xproj/yproj/ph into (e.g. OAxFORTIS_shm.LivePublisher.buffers).'''
+        self.range = range
+        self.bins = bins
+        self.xlut = bin_lookup(range[0][0], range[0][1], bins[0])
+        self.ylut = bin_lookup(range[1][0], range[1][1], bins[1])
+        self.xproj_lut = bin_lookup(range[0][0], range[0][1], proj_bins)
+        self.yproj_lut = bin_lookup(range[1][0], range[1][1], proj_bins)
+        out = out or {}
+        self.grid = out.get('grid', np.zeros(bins, dtype=dtype))
+        self.xproj = out.get('xproj', np.zeros(proj_bins, dtype=np.uint64))
+        self.yproj = out.get('yproj', np.zeros(proj_bins, dtype=np.uint64))
+        self.ph = out.get('ph', np.zeros(PH_BINS, dtype=np.uint64))
+        self.pyramid = DetectorPyramid() if pyramid else None
+        self.events = 0
+        self.version = 0 # bumped on every add, so a display can tell whether anything changed
+
+    def add(self, X, Y, P):
+        '''Add a batch of events (16-bit X, Y, pulse height arrays) to every histogram in one pass.'''
+        if len(X) == 0:
+            return
+        ix = self.xlut[X]
+        iy = self.ylut[Y]
+        inside = (ix >= 0) & (iy >= 0)
+        flat = ix[inside] * self.bins[1] + iy[inside]
+        grid = self.grid.reshape(-1)
+        if len(flat) < grid.size // 8:
+            np.add.at(grid, flat, 1) # small batch - no grid sized temporary
+        else:
+            grid += np.bincount(flat, minlength=grid.size).astype(grid.dtype)
+
+        for lut, values, proj in ((self.xproj_lut, X, self.xproj), (self.yproj_lut, Y, self.yproj)):
+            i = lut[values]
+            np.add.at(proj, i[i >= 0], 1)
+        self.ph += np.bincount(np.minimum(P, PH_BINS - 1), minlength=PH_BINS).astype(self.ph.dtype)
+        if self.pyramid is not None:
+            self.pyramid.add(X, Y)
+        self.events += len(X)
+        self.version += 1
+
+    def edges(self):
+        '''(X edges, Y edges) of grid, as np.histogram2d would return them.'''
+        return np.linspace(self.range[0][0], self.range[0][1], self.bins[0] + 1), np.linspace(self.range[1][0], self.range[1][1], self.bins[1] + 1)
+
+    def view(self, roi=None, max_pixels=512):
+        '''
+        (image indexed [y, x], extent) to draw: the whole grid if roi is None, otherwise the (xlo, xhi, ylo, yhi) crop served
+        from the pyramid.
+        '''
+        if roi is None or self.pyramid is None:
+            return self.grid.T.copy(), [self.range[0][0], self.range[0][1], self.range[1][0], self.range[1][1]]
+        return self.pyramid.query(roi, max_pixels)
+
+
+class PlotHistograms:
+    '''
+    One order's histograms for the post-run plots, counting only events with a non-zero pulse height:
+        grid    X/Y image, bins over range (np.histogram2d(X, Y, bins, range))
+        proj    X projections, one per entry of proj_bins, over proj_range (default: range's X) - edges in proj_edges
+        ph      pulse heights over ph_edges (np.histogram(P, ph_edges))
+    '''
+    def __init__(self, range, bins=(355,355), proj_range=None, proj_bins=(1000,1500), ph_edges=PH_EDGES):
+        self.range = range
+        proj_range = proj_range or range[0]
+        self.xlut = bin_lookup(range[0][0], range[0][1], bins[0])
+        self.ylut = bin_lookup(range[1][0], range[1][1], bins[1])
+        self.grid = np.zeros(bins, dtype=np.int64)
+        self.proj_edges = [np.linspace(proj_range[0], proj_range[1], b + 1) for b in proj_bins]
+        self.proj_luts = [edge_lookup(edges) for edges in self.proj_edges]
+        self.proj = [np.zeros(b, dtype=np.int64) for b in proj_bins]
+        self.ph_edges = ph_edges
+        self.ph_lut = edge_lookup(ph_edges)
+        self.ph = np.zeros(len(ph_edges) - 1, dtype=np.int64)
+        self.events = 0 # with pulse height > 0
+
+    def add(self, X, Y, P):
+        '''Add a chunk of events (16-bit X, Y, pulse height arrays) to every histogram.'''
+        hit = P != 0
+        if not hit.all():
+            X, Y, P = X[hit], Y[hit], P[hit]
+        if len(X) == 0:
+            return
+        ix = self.xlut[X]
+        iy = self.ylut[Y]
+        inside = (ix >= 0) & (iy >= 0)
+        self.grid += np.bincount(ix[inside] * self.grid.shape[1] + iy[inside], minlength=self.grid.size).reshape(self.grid.shape)
+        for lut, counts in zip(self.proj_luts, self.proj):
+            i = lut[X]
+            counts += np.bincount(i[i >= 0], minlength=len(counts))
+        i = self.ph_lut[P]
+        self.ph += np.bincount(i[i >= 0], minlength=len(self.ph))
+        self.events += len(X)
+
+    def edges(self):
+        '''(X edges, Y edges) of grid, as np.histogram2d would return them.'''
+        return np.linspace(self.range[0][0], self.range[0][1], self.grid.shape[0] + 1), np.linspace(self.range[1][0], self.range[1][1], self.grid.shape[1] + 1)
+
+    def density(self):
+        '''The X/Y image normalized like np.histogram2d(..., density=True).'''
+        area = np.diff(self.range[0])[0]/self.grid.shape[0] * np.diff(self.range[1])[0]/self.grid.shape[1]
+        return self.grid/max(self.grid.sum(), 1)/area
+
+
+class DetectorPyramid:
+    def __init__(self, dense_bits=(6, 11), tile_bits=TILE_BITS, tile_pending=TILE_PENDING):
+        self.dense_bits = dense_bits
+        self.levels = {b: np.zeros((1 << b, 1 << b), dtype=np.uint32) for b in range(dense_bits[0], dense_bits[1] + 1)} # [y, x]
+        self.tile_bits = tile_bits
+        self.side = 1 << (FULL_BITS - tile_bits) # tiles across
+        ntiles = self.side * self.side
+        # per tile: (y << tile_bits) | x within the tile of every pixel hit so far (sorted) and the events in each, or once a
+        # tile is busy, keys None and counts its whole count image
+        self.keys = [None] * ntiles
+        self.counts = [None] * ntiles
+        self.pending = np.zeros((ntiles, tile_pending), dtype=np.uint16) # per tile: keys of events not merged in yet
+        self.npending = np.zeros(ntiles, dtype=np.intp)
+
+    def add(self, X, Y):
+        '''Add a batch of events to every level (anything outside 0-16383 is dropped).'''
+        X = np.asarray(X, dtype=np.uint32)
+        Y = np.asarray(Y, dtype=np.uint32)
+        inside = (X < (1 << FULL_BITS)) & (Y < (1 << FULL_BITS))
+        if not inside.all():
+            X, Y = X[inside], Y[inside]
+        if len(X) == 0:
+            return
+        for b, level in self.levels.items():
+            shift = FULL_BITS - b
+            pixel = ((Y >> shift) << b) | (X >> shift)
+            if len(pixel) >= level.size >> 3: # big batch: count every pixel of the level at once
+                level.reshape(-1)[:] += np.bincount(pixel, minlength=level.size).astype(np.uint32)
+            else: # only the pixels hit (np.add.at is a lot slower than either)
+                pixel, counts = np.unique(pixel, return_counts=True)
+                level.reshape(-1)[pixel] += counts.astype(np.uint32)
+
+        # queue each event in its tile's pending row; a tile whose row would overflow is merged there and then
+        tb, mask = self.tile_bits, (1 << self.tile_bits) - 1
+        tile = ((Y >> tb) * self.side + (X >> tb)).astype(np.intp)
+        local = (((Y & mask) << tb) | (X & mask)).astype(np.uint16)
+        order = np.argsort(tile, kind='stable')
+        tile, local = tile[order], local[order]
+        starts = np.flatnonzero(np.r_[True, tile[1:] != tile[:-1]])
+        sizes = np.diff(np.append(starts, len(tile)))
+        tiles = tile[starts]
+        full = self.npending[tiles] + sizes > self.pending.shape[1]
+        queue = ~np.repeat(full, sizes)
+        rank = np.arange(len(tile)) - np.repeat(starts, sizes)
+        self.pending[tile[queue], self.npending[tile[queue]] + rank[queue]] = local[queue]
+        self.npending[tiles[~full]] += sizes[~full]
+        for t, a, n in zip(tiles[full], starts[full], sizes[full]):
+            self._merge(t, local[a:a + n])
+
+        # and keep up: merge about as many events as came in, from the tiles with the most waiting (at least half a row each)
+        half = self.pending.shape[1] // 2
+        ready = np.flatnonzero(self.npending >= half)
+        budget = len(X) // half + 1
+        if len(ready) > budget:
+            ready = ready[np.argpartition(self.npending[ready], -budget)[-budget:]]
+        for t in ready:
+            self._merge(t)
+
+    def _tile(self, t):
+        '''(sorted keys, counts) of tile t including its pending events, without changing anything.'''
+        pend = self.pending[t, :self.npending[t]]
+        if self.keys[t] is None and self.counts[t] is not None: # dense tile
+            table = self.counts[t] + np.bincount(pend, minlength=len(self.counts[t])).astype(np.uint32)
+            keys = np.flatnonzero(table).astype(np.uint16)
+            return keys, table[keys]
+        pend = np.sort(pend)
+        starts = np.flatnonzero(np.r_[True, pend[1:] != pend[:-1]]) if len(pend) else np.zeros(0, dtype=np.intp)
+        keys, counts = pend[starts], np.diff(np.append(starts, len(pend))).astype(np.uint32)
+        if self.keys[t] is None:
+            return keys, counts
+        # fold into the tile's table: counts of pixels already there go up, new pixels are inserted in order
+        at = np.searchsorted(self.keys[t], keys)
+        there = at < len(self.keys[t])
+        there[there] = self.keys[t][at[there]] == keys[there]
+        table = self.counts[t].copy()
+        table[at[there]] += counts[there]
+        return np.insert(self.keys[t], at[~there], keys[~there]), np.insert(table, at[~there], counts[~there])
+
+    def _merge(self, t, extra=None):
+        '''Fold tile t's pending events (and extra, more keys of the same tile) into its table. Costs at most a tile's worth.'''
+        if extra is not None and len(extra):
+            n = self.npending[t]
+            while len(extra): # extra can be longer than the pending row
+                take = min(len(extra), self.pending.shape[1] - n)
+                self.pending[t, n:n + take] = extra[:take]
+                self.npending[t] = n + take
+                extra = extra[take:]
+                if len(extra):
+                    self._merge(t)
+                    n = 0
+        pixels = 1 << 2*self.tile_bits
+        if self.keys[t] is None and self.counts[t] is not None: # dense tile
+            self.counts[t] += np.bincount(self.pending[t, :self.npending[t]], minlength=pixels).astype(np.uint32)
+        else:
+            self.keys[t], self.counts[t] = self._tile(t)
+            if len(self.keys[t]) > pixels // 4: # a quarter of the pixels hit: a plain count image is smaller and faster to add to
+                dense = np.zeros(pixels, dtype=np.uint32)
+                dense[self.keys[t]] = self.counts[t]
+                self.keys[t], self.counts[t] = None, dense
+        self.npending[t] = 0
+
+    def level_for(self, roi, max_pixels=512):
+        '''Finest level (bits per axis) that shows the (xlo, xhi, ylo, yhi) region in no more than max_pixels bins across.'''
+        span = max(abs(roi[1] - roi[0]), abs(roi[3] - roi[2]), 1)
+        b = FULL_BITS - int(np.ceil(np.log2(max(span/max_pixels, 1))))
+        return max(self.dense_bits[0], min(b, FULL_BITS))
+
+    def query(self, roi, max_pixels=512):
+        '''(image indexed [y, x], extent) of the (xlo, xhi, ylo, yhi) region in detector pixels, at level_for(roi).'''
+        b = self.level_for(roi, max_pixels)
+        cell = 1 << (FULL_BITS - b)
+        xlo, xhi = sorted(roi[:2])
+        ylo, yhi = sorted(roi[2:])
+        ix0, iy0 = (min(max(int(v) // cell, 0), (1 << b) - 1) for v in (xlo, ylo)) # at least one bin, on the detector
+        ix1, iy1 = (min(-(-int(np.ceil(v)) // cell), 1 << b) for v in (xhi, yhi))
+        ix1, iy1 = max(ix1, ix0 + 1), max(iy1, iy0 + 1)
+        if b in self.levels:
+            image = self.levels[b][iy0:iy1, ix0:ix1].copy()
+        else:
+            # only the tiles under the region are read, so the cost depends on the region and not on how long the run is
+            shift = FULL_BITS - b
+            w = ix1 - ix0
+            image = np.zeros((iy1 - iy0) * w, dtype=np.uint32)
+            tb = self.tile_bits
+            for ty in range((iy0 << shift) >> tb, (((iy1 << shift) - 1) >> tb) + 1):
+                for tx in range((ix0 << shift) >> tb, (((ix1 << shift) - 1) >> tb) + 1):
+                    keys, counts = self._tile(ty * self.side + tx)
+                    x = (((keys & ((1 << tb) - 1)).astype(np.intp)) + (tx << tb)) >> shift
+                    y = (((keys >> tb).astype(np.intp)) + (ty << tb)) >> shift
+                    mine = (x >= ix0) & (x < ix1) & (y >= iy0) & (y < iy1)
+                    image += np.bincount((y[mine] - iy0) * w + (x[mine] - ix0), weights=counts[mine], minlength=len(image)).astype(np.uint32)
+            image = image.reshape(iy1 - iy0, w)
+        return image, [ix0*cell, ix1*cell, iy0*cell, iy1*cell]
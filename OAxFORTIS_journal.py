@@ -0,0 +1,103 @@
+'''
+Created: 10/18/2026
+
+Raw packet journal - every datagram exactly as it came off the socket, so a run can be re-analyzed (or replayed with
+OAxFORTIS_replay.py) from the original bytes.
+
+A journal is two append-only files:
+    <name>.jrn  the packet bytes, back to back
+    <name>.jdx  one 32-byte index record per packet: byte offset into .jrn (uint64), length (uint16), source port (uint16),
+                source IPv4 address (uint32), monotonic receive time (float64), wall clock receive time (float64)
+Like the binary event store, both files are plain records that can be memory mapped, and the packet bytes are always
+written before the index record that points to them.
+
+(Datagrams longer than 1458 bytes are cut to 1458 by the receive ring, so that is what gets journaled.)
+'''
+
+import os
+import socket
+import struct
+import numpy as np
+from OAxFORTIS_decode import PACKET_BYTES
+
+INDEX_RECORD = np.dtype([('offset', '<u8'), ('length', '<u2'), ('port', '<u2'), ('ip', '<u4'), ('mono', '<f8'), ('time', '<f8')])
+
+
+def pack_ip(ip):
+    return struct.unpack('!I', socket.inet_aton(ip))[0]
+
+
+def unpack_ip(ip):
+    return socket.inet_ntoa(struct.pack('!I', int(ip)))
+
+
+class JournalSink:
+    '''
+    Sink for OAxFORTIS_writers.GroupCommitWriter. write() takes a (ring, batch) pair as returned by
+    OAxFORTIS_receive.PacketRing.drain() and appends the whole batch.
+    '''
+    def __init__(self, name):
+        self.name = name
+        self.fjrn = open(name + '.jrn', 'ab')
+        self.fjdx = open(name + '.jdx', 'ab')
+        self.offset = self.fjrn.tell()
+
+    def write(self, ring_batch):
+        ring, batch = ring_batch
+        count = batch.stop - batch.start
+        if count == 0:
+            return 0
+        nbytes = ring.nbytes[batch]
+        raw = ring.raw(batch)
+        if (nbytes == PACKET_BYTES).all():
+            self.fjrn.write(raw) # the usual case - one write for the whole batch
+        else:
+            for i in range(count):
+                self.fjrn.write(raw[i*PACKET_BYTES:i*PACKET_BYTES + nbytes[i]])
+
+        index = np.empty(count, dtype=INDEX_RECORD)
+        index['length'] = nbytes
+        index['offset'] = self.offset + np.cumsum(nbytes) - nbytes
+        addresses = ring.addresses[batch.start:batch.stop]
+        index['ip'] = [pack_ip(a[0]) for a in addresses]
+        index['port'] = [a[1] for a in addresses]
+        index['mono'] = ring.mono[batch]
+        index['time'] = ring.times[batch]
+        self.fjdx.write(index.tobytes())
+
+        written = int(nbytes.sum())
+        self.offset += written
+        return written + index.nbytes
+
+    def flush(self):
+        self.fjrn.flush() # packet bytes first, so an index record never points past the end of .jrn
+        self.fjdx.flush()
+
+    def sync(self):
+        os.fsync(self.fjrn.fileno())
+        os.fsync(self.fjdx.fileno())
+
+    def close(self):
+        self.flush()
+        self.fjrn.close()
+        self.fjdx.close()
+
+
+def open_journal(name):
+    '''Memory map (index, data) of a journal. Only packets whose bytes are fully on disk are included.'''
+    size = os.path.getsize(name + '.jrn')
+    count = os.path.getsize(name + '.jdx') // INDEX_RECORD.itemsize
+    if count == 0 or size == 0:
+        return np.zeros(0, dtype=INDEX_RECORD), np.zeros(0, dtype=np.uint8)
+    index = np.memmap(name + '.jdx', dtype=INDEX_RECORD, mode='r', shape=(count,))
+    data = np.memmap(name + '.jrn', dtype=np.uint8, mode='r', shape=(size,))
+    index = index[index['offset'] + index['length'] <= size]
+    return index, data
+
+
+def read_packets(name):
+    '''Yield (bytes, (ip, port), monotonic time, wall clock time) for every packet in a journal, in receive order.'''
+    index, data = open_journal(name)
+    for rec in index:
+        start = int(rec['offset'])
+        yield bytes(data[start:start + int(rec['length'])]), (unpack_ip(rec['ip']), int(rec['port'])), float(rec['mono']), float(rec['time'])
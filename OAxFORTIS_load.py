@@ -0,0 +1,208 @@
+'''
+Created: 10/18/2026
+
+Fast loading of the Zero/Pos1/Neg1 event csv files for plotting (OAxFORTISplots.py) and everything else that reads them.
+
+Files are read through mmap and parsed a chunk (CHUNK_BYTES, cut at a line end) at a time, straight from the mapped bytes:
+numpy's C parser (np.loadtxt) takes each whole chunk in one call, straight into the typed columns, so no Python string is
+ever made per line or per value - only the chunk's own text. Whether a file is tab delimited (everything before 11/16/23, like the
+Feb0123 files here) or comma delimited (OAxFORTIS_datacollect.py since) is picked up from its first line, so old and new
+archives load the same way. parse_rows counts the lines first and fills one preallocated output, so besides the result only
+a couple of chunks are ever held.
+
+For analysis, load_table parses a file once into an OAxFORTIS_eventstore.EventTable (5 bytes per event plus 24 per packet,
+instead of the 48 bytes per event of np.loadtxt's float64 matrix), and saves it next to the csv as a binary cache,
+<file>.rows:
+    header   magic, size and modification time (ns) of the csv it came from, number of events and of packets
+    events   the EVENT_RECORD records, little endian, back to back
+    packets  the PACKET_RECORD records
+The next load of the same file just maps the cache, as long as the csv's size and modification time still match (a csv
+that is still being written gets parsed again). If the folder can't be written to, the file is simply parsed every time.
+For files too big to hold, iter_tables goes through one a chunk at a time instead (from the cache, or parsing it and writing
+the cache as it goes - events come first in the cache so they can be written before the packet count is known).
+'''
+
+import io
+import os
+import mmap
+import numpy as np
+from OAxFORTIS_decode import ROW_DTYPE
+from OAxFORTIS_eventstore import EventTable, EVENT_RECORD, PACKET_RECORD, join_packets
+
+CACHE_SUFFIX = '.rows'
+CACHE_MAGIC = b'OAXTAB02'
+CACHE_HEADER = np.dtype([('magic', 'S8'), ('size', '<u8'), ('mtime_ns', '<i8'), ('events', '<u8'), ('packets', '<u8')])
+
+CHUNK_BYTES = 1 << 24
+
+
+def sniff_delimiter(path):
+    '''\t or , - whichever the file's first line uses.'''
+    with open(path, 'rb') as f:
+        return '\t' if b'\t' in f.readline() else ','
+
+
+def _chunks(mm, start, end, chunk_bytes):
+    '''(start, end) byte ranges of mm from start to end, each ending at a line end (or at end).'''
+    while start < end:
+        stop = min(start + chunk_bytes, end)
+        if stop < end:
+            cut = mm.rfind(b'\n', start, stop)
+            if cut < 0: # a line longer than a chunk
+                cut = mm.find(b'\n', stop, end)
+            stop = end if cut < 0 else cut + 1
+        yield start, stop
+        start = stop
+
+
+def _parse(text, delimiter):
+    if not text.strip():
+        return np.zeros(0, dtype=ROW_DTYPE)
+    return np.loadtxt(io.StringIO(text.decode('ascii')), delimiter=delimiter, dtype=ROW_DTYPE, ndmin=1)
+
+
+def iter_rows(path, start=0, end=None, chunk_bytes=CHUNK_BYTES):
+    '''Yield ROW_DTYPE rows for consecutive chunks of bytes [start, end) of an event csv (start at a line start).'''
+    size = os.path.getsize(path)
+    end = size if end is None else min(end, size)
+    if end <= start:
+        return
+    delimiter = sniff_delimiter(path)
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for a, b in _chunks(mm, start, end, chunk_bytes):
+            rows = _parse(mm[a:b], delimiter)
+            _release(mm, a, b)
+            yield rows
+
+
+def _release(mm, a, b):
+    '''Let go of the mapped pages of bytes [a, b) once parsed, so going through a big file doesn't keep all of it resident.'''
+    if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_DONTNEED'):
+        a -= a % mmap.PAGESIZE
+        if b > a:
+            mm.madvise(mmap.MADV_DONTNEED, a, b - a)
+
+
+def parse_rows(path, chunk_bytes=CHUNK_BYTES):
+    '''All ROW_DTYPE rows of an event csv (tab or comma delimited), parsed into one preallocated array.'''
+    size = os.path.getsize(path)
+    if size == 0:
+        return np.zeros(0, dtype=ROW_DTYPE)
+    delimiter = sniff_delimiter(path)
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        lines = sum(mm[a:b].count(b'\n') for a, b in _chunks(mm, 0, size, chunk_bytes)) + (mm[size-1:size] != b'\n')
+        rows = np.empty(lines, dtype=ROW_DTYPE)
+        filled = 0
+        for a, b in _chunks(mm, 0, size, chunk_bytes):
+            part = _parse(mm[a:b], delimiter)
+            if filled + len(part) > lines:
+                raise ValueError('{}: changed while being read'.format(path))
+            rows[filled:filled+len(part)] = part
+            filled += len(part)
+    return rows[:filled] if filled < lines else rows # blank lines counted but not parsed
+
+
+def _read_cache(path, st):
+    '''The cache of path as a memory mapped EventTable, None if it has none that matches st (its os.stat).'''
+    cache = path + CACHE_SUFFIX
+    if not os.path.exists(cache):
+        return None
+    header = np.fromfile(cache, dtype=CACHE_HEADER, count=1)
+    if len(header) == 0 or header['magic'][0] != CACHE_MAGIC or header['size'][0] != st.st_size or header['mtime_ns'][0] != st.st_mtime_ns:
+        return None
+    nevents, npackets = int(header['events'][0]), int(header['packets'][0])
+    if os.path.getsize(cache) != CACHE_HEADER.itemsize + nevents*EVENT_RECORD.itemsize + npackets*PACKET_RECORD.itemsize:
+        return None
+    events = np.memmap(cache, dtype=EVENT_RECORD, mode='r', offset=CACHE_HEADER.itemsize, shape=(nevents,)) if nevents else np.zeros(0, dtype=EVENT_RECORD)
+    packets = np.memmap(cache, dtype=PACKET_RECORD, mode='r', offset=CACHE_HEADER.itemsize + nevents*EVENT_RECORD.itemsize,
+                        shape=(npackets,)) if npackets else np.zeros(0, dtype=PACKET_RECORD)
+    return EventTable(events, packets)
+
+
+class _CacheWriter:
+    '''Writes the cache of path a chunk (EventTable) at a time. Only replaces <file>.rows once close() has the whole file.'''
+    def __init__(self, path, st):
+        self.path = path
+        self.st = st
+        self.tmp = path + CACHE_SUFFIX + '.tmp'
+        self.parts = [] # packets of every chunk, joined at the end
+        self.nevents = 0
+        try:
+            self.f = open(self.tmp, 'wb')
+            self.f.write(np.zeros(1, dtype=CACHE_HEADER).tobytes()) # filled in by close()
+        except OSError: # read-only data folder - no cache, no harm
+            self.f = None
+
+    def add(self, table):
+        if self.f is None:
+            return
+        try:
+            self.f.write(table.events.tobytes())
+        except OSError:
+            self.abort()
+            return
+        self.parts.append(table.packets)
+        self.nevents += len(table.events)
+
+    def close(self):
+        if self.f is None:
+            return
+        packets = join_packets(self.parts)
+        header = np.zeros(1, dtype=CACHE_HEADER)
+        header['magic'] = CACHE_MAGIC
+        header['size'] = self.st.st_size
+        header['mtime_ns'] = self.st.st_mtime_ns
+        header['events'] = self.nevents
+        header['packets'] = len(packets)
+        try:
+            self.f.write(packets.tobytes())
+            self.f.seek(0)
+            self.f.write(header.tobytes())
+            self.f.close()
+            os.replace(self.tmp, self.path + CACHE_SUFFIX)
+        except OSError:
+            self.abort()
+        self.f = None
+
+    def abort(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+        if os.path.exists(self.tmp):
+            os.remove(self.tmp)
+
+
+def iter_tables(path, cache=True, chunk_bytes=CHUNK_BYTES):
+    '''
+    An event csv as consecutive EventTables of about chunk_bytes of csv each (a packet may be split between two), for going
+    through a file too big to hold: straight from its cache if it has a valid one, otherwise parsed - writing the cache
+    along the way, if the whole file is gone through.
+    '''
+    st = os.stat(path)
+    table = _read_cache(path, st) if cache else None
+    if table is not None:
+        yield from table.chunks(max(chunk_bytes // 32, 1)) # ~32 bytes of csv per event
+        return
+    writer = _CacheWriter(path, st) if cache else None
+    try:
+        for rows in iter_rows(path, chunk_bytes=chunk_bytes):
+            table = EventTable.from_rows(rows)
+            if writer is not None:
+                writer.add(table)
+            yield table
+        if writer is not None:
+            writer.close()
+    finally:
+        if writer is not None:
+            writer.abort() # stopped early (or failed): no cache
+
+
+def load_table(path, cache=True, chunk_bytes=CHUNK_BYTES):
+    '''
+    An event csv (tab or comma delimited) as an OAxFORTIS_eventstore.EventTable, from its cache if it has a valid one.
+    Each chunk is turned into the compact table as soon as it's parsed, so the full file is never held as rows.
+    '''
+    table = _read_cache(path, os.stat(path)) if cache else None
+    if table is not None:
+        return table
+    return EventTable.concatenate(list(iter_tables(path, cache, chunk_bytes)))
@@ -0,0 +1,81 @@
+'''
+Created: 10/18/2026
+
+Acquisition metrics over HTTP in the Prometheus text format, for watching a long run from another terminal or a dashboard:
+                curl -s localhost:9101/metrics
+(OAxFORTIS_datacollect.py --metrics 9101.)
+
+The server runs on its own daemon thread and only ever reads the latest Metrics the receive loop handed it with publish().
+The receive loop just fills in a new Metrics every time it updates the plots and swaps it in - it never waits on a request,
+and a request never sees half an update.
+'''
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Metrics:
+    '''One set of samples: add() each value, grouped into families by name.'''
+    def __init__(self):
+        self.families = {} # name -> (type, help, [(labels, value)])
+
+    def add(self, name, kind, help, value, **labels):
+        self.families.setdefault(name, (kind, help, []))[2].append((labels, value))
+
+    def summary(self, name, help, hist, **labels):
+        '''A OAxFORTIS_stats.LatencyHistogram of durations as a Prometheus summary in seconds.'''
+        for q in QUANTILES:
+            self.add(name, 'summary', help, hist.percentile(100*q), quantile=q, **labels)
+        self.add(name + '_sum', None, None, hist.total, **labels)
+        self.add(name + '_count', None, None, hist.n, **labels)
+
+    def text(self):
+        lines = []
+        for name, (kind, help, samples) in self.families.items():
+            if help:
+                lines.append('# HELP {} {}'.format(name, help))
+            if kind:
+                lines.append('# TYPE {} {}'.format(name, kind))
+            for labels, value in samples:
+                label_text = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels.items())
+                lines.append('{}{} {}'.format(name, '{' + label_text + '}' if label_text else '', float(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    def __init__(self, port, host='127.0.0.1'):
+        self.latest = Metrics()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = server.latest.text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args): # keep the acquisition terminal clean
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='metrics', daemon=True)
+        self.thread.start()
+
+    @property
+    def address(self):
+        return self.httpd.server_address
+
+    def publish(self, metrics):
+        self.latest = metrics # swapping the reference is atomic, requests in flight keep the one they started with
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
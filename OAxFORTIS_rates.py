@@ -0,0 +1,109 @@
+'''
+Created: 10/18/2026
+
+Count rates, computed the same way live (OAxFORTIS_datacollect.py) and after the fact (OAxFORTISplots.py, OAxFORTIS_VIM2CSV.py)
+so the numbers agree.
+
+Every packet is a (time stamp, number of events) pair, and its events are counted as arriving between the previous packet's
+time stamp and its own. The rate over a window ending at time t is then
+    events in the packets stamped within (t - window, t]  /  time from the last packet before the window to the last one in it
+so a window never counts half a packet.
+
+RateMeter keeps the latest pairs in a fixed size ring buffer with a running total, so the sliding window rate and a smoothed
+(EWMA, time constant tau) rate cost the same no matter how long the run is. window_rates gives the sliding window rate at any
+list of times straight from a whole file's worth of packets (cumulative sums + np.searchsorted, no loop over packets), and
+rate_curve samples it every step seconds for plotting.
+'''
+
+import numpy as np
+
+
+class RateMeter:
+    def __init__(self, window=1.5, tau=5., capacity=4096, start=None):
+        self.window = window
+        self.tau = tau
+        self.times = np.zeros(capacity)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.head = 0     # next slot to fill
+        self.size = 0     # packets in the ring (all within the window)
+        self.total = 0    # events in those packets
+        self.ref = start  # time stamp of the last packet that left the window (start of the covered time)
+        self.last = start # time stamp of the newest packet
+        self.ewma = 0.
+        self.events = 0
+
+    def add(self, times, counts):
+        '''Add packets in time order: their time stamps and number of events (arrays or single values).'''
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        counts = np.atleast_1d(np.asarray(counts, dtype=np.int64))
+        capacity = len(self.times)
+        for t, c in zip(times.tolist(), counts.tolist()): # a handful of packets per batch
+            if self.last is None: # nothing to measure the first packet's events against
+                self.ref = self.last = t
+                continue
+            dt = t - self.last
+            if dt > 0:
+                a = 1 - np.exp(-dt/self.tau)
+                self.ewma += a*(c/dt - self.ewma)
+            if self.size == capacity: # ring full - oldest packet leaves early
+                self._drop()
+            self.times[self.head] = t
+            self.counts[self.head] = c
+            self.head = (self.head + 1) % capacity
+            self.size += 1
+            self.total += c
+            self.events += c
+            self.last = t
+        while self.size and self.times[(self.head - self.size) % capacity] <= self.last - self.window:
+            self._drop()
+
+    def _drop(self):
+        tail = (self.head - self.size) % len(self.times)
+        self.ref = self.times[tail]
+        self.total -= self.counts[tail]
+        self.size -= 1
+
+    def rate(self):
+        '''Sliding window rate in counts/s (0 until two packets have arrived).'''
+        span = self.last - self.ref if self.last is not None else 0
+        return self.total/span if span > 0 else 0.
+
+
+def packet_counts(times):
+    '''(time stamp, number of rows) of every packet in an event table's time column - rows of a packet share its time stamp.'''
+    times = np.asarray(times, dtype=float)
+    if len(times) == 0:
+        return np.zeros(0), np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.insert(np.diff(times) != 0, 0, True))
+    return times[starts], np.diff(np.append(starts, len(times)))
+
+
+def window_rates(times, counts, window=1.5, at=None, start=None):
+    '''
+    Sliding window rate (counts/s) at each time in at (default: every packet), as RateMeter.rate() would read right then.
+    times/counts are the packets' time stamps (sorted) and event counts. Without start, the first packet only marks the
+    beginning. nan where there's nothing to measure yet.
+    '''
+    times = np.asarray(times, dtype=float)
+    csum = np.concatenate([[0], np.cumsum(counts)])
+    if start is None: # first packet's events came before anything we can measure from
+        csum[1:] -= csum[1]
+        start = times[0] if len(times) else 0.
+    at = times if at is None else np.asarray(at, dtype=float)
+    end = np.searchsorted(times, at, side='right')             # packets stamped up to each time
+    begin = np.searchsorted(times, at - window, side='right')  # ... minus those already out of the window
+    last = np.where(end > 0, times[np.maximum(end - 1, 0)], start)
+    ref = np.where(begin > 0, times[np.maximum(begin - 1, 0)], start)
+    span = last - ref
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(span > 0, (csum[end] - csum[begin])/span, np.nan)
+
+
+def rate_curve(times, counts, step=1.5, window=None, start=None):
+    '''(sample times, rates) every step seconds through the run, each the rate over the preceding window (default step).'''
+    times = np.asarray(times, dtype=float)
+    if len(times) < 2:
+        return np.zeros(0), np.zeros(0)
+    first = times[0] if start is None else start
+    at = np.arange(first + step, times[-1] + step/2, step)
+    return at, window_rates(times, counts, step if window is None else window, at, start)
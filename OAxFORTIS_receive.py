@@ -0,0 +1,177 @@
+'''
+Created: 10/18/2026
+
+Batched UDP receive path for OAxFORTIS TDC packets.
+
+PacketRing is a preallocated bytearray split into 1458-byte packet slots. drain() waits for one packet, then keeps calling
+recvfrom_into (non-blocking) until the socket is empty or the end of the ring is reached, so a burst from all three TDCs is
+pulled out of the kernel in one go without allocating a new bytes object per packet. The filled slots are handed back as
+one contiguous batch that OAxFORTIS_decode.decode_batch can view without copying. Several sockets (ports/interfaces) can be
+drained into the same ring.
+
+The ring wraps: the next drain() starts where the last one stopped, so a batch stays valid until the ring comes back
+around to it (i.e. for the next slots-len(batch) packets).
+
+When packets arrive faster than they're read, the socket's kernel receive buffer fills and the kernel silently drops what
+doesn't fit - these never show up as anything but packet number gaps. open_socket asks for a bigger buffer (SO_RCVBUF) and
+reports what the kernel actually granted (it is capped by net.core.rmem_max unless running as root). The kernel's drop count
+for each socket is read from /proc/net/udp by KernelDropMonitor, and with rxq_ovfl the same count also arrives with every
+packet received after a drop (SO_RXQ_OVFL, Linux only), so drops in the kernel can be told apart from packets lost before
+they reached this machine.
+'''
+
+import os
+import sys
+import select
+import socket
+import time
+import asyncio
+import numpy as np
+from OAxFORTIS_decode import PACKET_BYTES, decode_batch
+
+SO_RXQ_OVFL = getattr(socket, 'SO_RXQ_OVFL', 40) # Linux only, not exported by every Python build
+PROC_UDP = ('/proc/net/udp', '/proc/net/udp6')
+
+
+def open_socket(address, rcvbuf=None, rxq_ovfl=False):
+    '''
+    UDP socket bound to address. rcvbuf asks for a kernel receive buffer of that many bytes, rxq_ovfl turns on the drop
+    count that comes with received packets. Returns (socket, receive buffer size the kernel granted in bytes).
+    '''
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if rcvbuf:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        if receive_buffer(sock) < rcvbuf and hasattr(socket, 'SO_RCVBUFFORCE'):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUFFORCE, rcvbuf) # past rmem_max, needs root
+            except PermissionError:
+                pass
+    if rxq_ovfl:
+        sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+    sock.bind(address)
+    return sock, receive_buffer(sock)
+
+
+def receive_buffer(sock):
+    '''Usable kernel receive buffer of a socket in bytes (Linux reports double the size, the rest is its own bookkeeping).'''
+    size = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    return size // 2 if sys.platform.startswith('linux') else size
+
+
+class KernelDropMonitor:
+    '''Kernel side drop counters and receive queue lengths of some UDP sockets, read from /proc/net/udp (Linux).'''
+    def __init__(self, socks):
+        self.inodes = {os.fstat(sock.fileno()).st_ino: k for k, sock in enumerate(socks)}
+        self.drops = [0] * len(socks)
+        self.queued = [0] * len(socks) # bytes waiting in each receive buffer
+        self.available = any(os.path.exists(path) for path in PROC_UDP)
+
+    def poll(self):
+        '''Re-read the counters. Returns the total kernel drops on all the sockets since they were opened.'''
+        for path in PROC_UDP:
+            try:
+                with open(path) as f:
+                    next(f) # header
+                    for line in f:
+                        fields = line.split()
+                        k = self.inodes.get(int(fields[9]))
+                        if k is not None:
+                            self.queued[k] = int(fields[4].split(':')[1], 16)
+                            self.drops[k] = int(fields[12])
+            except OSError:
+                continue
+        return sum(self.drops)
+
+
+class PacketRing:
+    '''
+    sources maps a packet's source address to a small integer (e.g. OAxFORTIS_registry.Registry.index). With rxq_ovfl the
+    kernel drop count that comes with packets (see open_socket) is kept in overflows, per socket file descriptor.
+    '''
+    def __init__(self, slots=512, sources=None, rxq_ovfl=False):
+        self.slots = slots
+        self.buf = bytearray(slots * PACKET_BYTES)
+        view = memoryview(self.buf)
+        self.slot_views = [view[i*PACKET_BYTES:(i+1)*PACKET_BYTES] for i in range(slots)]
+        self.nbytes = np.zeros(slots, dtype=np.intp)
+        self.times = np.zeros(slots)              # time.time() each packet was received
+        self.mono = np.zeros(slots)               # time.monotonic() each packet was received (for journaling/latency)
+        self.source = np.full(slots, -1, dtype=np.intp) # index from the sources dict, -1 for unknown addresses
+        self.addresses = [None] * slots
+        self.sources = sources if sources is not None else {}
+        self.head = 0
+        self.received = 0
+        self.ancillary = socket.CMSG_SPACE(4) if rxq_ovfl else 0
+        self.overflows = {}
+
+    def drain(self, socks, timeout=None):
+        '''
+        Wait up to timeout seconds (None = forever) for a packet, then read everything waiting on the socket (or on every
+        socket in a list of them). Returns the slice of ring slots that were filled (empty if the wait timed out).
+        '''
+        if self.head == self.slots:
+            self.head = 0
+        start = i = self.head
+        if not isinstance(socks, (list, tuple)):
+            socks = [socks]
+        for sock in socks:
+            sock.setblocking(False)
+        readable, _, _ = select.select(socks, [], [], timeout)
+        for sock in readable:
+            while i < self.slots:
+                try:
+                    if self.ancillary:
+                        nbytes, ancdata, _, address = sock.recvmsg_into([self.slot_views[i]], self.ancillary)
+                        for level, kind, data in ancdata: # only there once the socket has dropped something
+                            if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL:
+                                self.overflows[sock.fileno()] = int.from_bytes(data[:4], sys.byteorder)
+                    else:
+                        nbytes, address = sock.recvfrom_into(self.slot_views[i], PACKET_BYTES)
+                except (BlockingIOError, InterruptedError):
+                    break
+                if nbytes < PACKET_BYTES: # runt packet, don't let the previous occupant's events leak through
+                    self.slot_views[i][nbytes:] = bytes(PACKET_BYTES - nbytes)
+                self.nbytes[i] = nbytes
+                self.times[i] = time.time()
+                self.mono[i] = time.monotonic()
+                self.source[i] = self.sources.get(address, -1)
+                self.addresses[i] = address
+                i += 1
+        self.head = i
+        self.received += i - start
+        return slice(start, i)
+
+    def raw(self, batch):
+        '''The received bytes of a batch as one contiguous memoryview (slots are PACKET_BYTES apart, see nbytes for each length).'''
+        return memoryview(self.buf)[batch.start*PACKET_BYTES:batch.stop*PACKET_BYTES]
+
+    def packets(self, batch):
+        '''Structured array view (see OAxFORTIS_decode.PACKET_DTYPE) of the packets in a slice returned by drain().'''
+        return decode_batch(self.raw(batch))
+
+
+class TDCProtocol(asyncio.DatagramProtocol):
+    '''
+    asyncio receiver: every datagram is handed to handler(k, data, address, t) where k is the source's index in the
+    registry (-1 if the address isn't in it) and t is time.time() on arrival.
+    '''
+    def __init__(self, registry, handler):
+        self.lookup = registry.index.get
+        self.handler = handler
+
+    def datagram_received(self, data, address):
+        self.handler(self.lookup(address, -1), data, address, time.time())
+
+
+async def listen(registry, handler, addresses, rcvbuf=None):
+    '''
+    Start a TDCProtocol on each (ip, port) in addresses, asking for rcvbuf byte kernel receive buffers. Returns the
+    transports (close them when done).
+    '''
+    loop = asyncio.get_running_loop()
+    transports = []
+    for address in addresses:
+        sock, _ = open_socket(address, rcvbuf)
+        transport, _ = await loop.create_datagram_endpoint(lambda: TDCProtocol(registry, handler), sock=sock)
+        transports.append(transport)
+    return transports
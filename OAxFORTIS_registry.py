@@ -0,0 +1,87 @@
+'''
+Created: 10/18/2026
+
+Table of TDC packet sources, shared by OAxFORTIS_datacollect.py and OAxFORTIS_Server.py.
+
+Each source maps the address a TDC sends from to the spectral order it belongs to: the order name used for output files
+(Zero/Pos1/Neg1 -> Zero_<modifier>.csv etc.), the label shown on plots, and the X/Y range of its live histogram. Packets are
+routed with a single dict lookup on their source address, so adding a TDC or a bench setup is a config change rather than
+another elif.
+
+The built-in table is the flight setup. To use a different one, write a JSON file like OAxFORTIS_sources.json and pass it
+with --sources. "listen" is optional and lists every (ip, port) to receive on (several ports/interfaces at once are fine);
+"aliases" lets extra addresses stand in for a TDC. The aliases in OAxFORTIS_sources.json itself (SOURCES_FILE) are the local
+addresses OAxFORTIS_replay.py sends each TDC's packets from, and that OAxFORTIS_datacollect.py --local accepts.
+'''
+
+import os
+import json
+
+SOURCES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'OAxFORTIS_sources.json')
+
+# the flight setup. The live window draws the first entry on the right, so this reads -1, 0, +1 left to right on screen.
+# width is the relative width of the plot panel, flip_x mirrors it (the -1 order is seen from the other side)
+DEFAULT_SOURCES = [
+    {'address': ['192.168.1.11', 62510], 'order': 'Pos1', 'label': '+1 Order', 'title': '+1 Order (270°)', 'range': [[1700,13800],[2100,13090]], 'width': 63.5/43},
+    {'address': ['192.168.1.10', 62510], 'order': 'Zero', 'label': 'Zero Order', 'title': 'Zero Order', 'range': [[1300,13500],[1750,13090]]},
+    {'address': ['192.168.1.12', 62510], 'order': 'Neg1', 'label': '-1 Order', 'title': '-1 Order (90°)', 'range': [[1900,13400],[2100,13090]], 'width': 63.5/43, 'flip_x': True},
+]
+
+
+def parse_address(text):
+    '''"host:port" -> (host, port). An empty host means every interface.'''
+    host, port = text.rsplit(':', 1)
+    return (host, int(port))
+
+
+class Source:
+    def __init__(self, address, order, label=None, title=None, range=None, width=1., flip_x=False):
+        self.address = (address[0], int(address[1]))
+        self.order = order
+        self.label = label or order
+        self.title = title or self.label
+        self.range = range or [[0,16383],[0,16383]]
+        self.width = width
+        self.flip_x = flip_x
+
+    @property
+    def extent(self):
+        return [self.range[0][0], self.range[0][1], self.range[1][0], self.range[1][1]]
+
+
+class Registry:
+    def __init__(self, sources, listen=None, aliases=None):
+        self.sources = [s if isinstance(s, Source) else Source(**s) for s in sources]
+        self.listen = [(host, int(port)) for host, port in listen] if listen else None
+        self.index = {s.address: k for k, s in enumerate(self.sources)} # source address -> index into self.sources
+        self.aliases = {} # extra address -> address of the TDC it stands in for
+        for alias, address in (aliases or {}).items():
+            self.alias(parse_address(alias), parse_address(address))
+
+    def __len__(self):
+        return len(self.sources)
+
+    def __getitem__(self, k):
+        return self.sources[k]
+
+    def alias(self, extra, address):
+        '''Treat packets from the extra address as coming from the TDC at address.'''
+        self.index[extra] = self.index[address]
+        self.aliases[extra] = address
+
+    def stand_ins(self):
+        '''{TDC address: extra address standing in for it} of the aliases.'''
+        return {address: extra for extra, address in self.aliases.items()}
+
+    def lookup(self, address):
+        '''Index of the source a packet came from, or -1 if it isn't in the table.'''
+        return self.index.get(address, -1)
+
+    @classmethod
+    def load(cls, path=None):
+        '''The table in a JSON config file, or the built-in flight table if path is None.'''
+        if path is None:
+            return cls(DEFAULT_SOURCES)
+        with open(path) as f:
+            config = json.load(f)
+        return cls(config['sources'], config.get('listen'), config.get('aliases'))
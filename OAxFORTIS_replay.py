@@ -0,0 +1,155 @@
+'''
+Created: 10/18/2026
+
+Replays TDC traffic to a local UDP port so the receive path can be load-tested and benchmarked without flight hardware.
+
+Packets come either from a raw packet journal (OAxFORTIS_datacollect.py --journal, see OAxFORTIS_journal.py) or are
+synthesized from existing event files (Zero_/Pos1_/Neg1_ csv files - tab or comma delimited - or binary .evt stores). Each
+packet is sent from a local socket standing in for the TDC it came from. The real TDCs are 192.168.1.10/11/12 : 62510, which
+a laptop can't send from, so each role is mapped to a local address: the "aliases" of OAxFORTIS_sources.json (127.0.0.1
+ports 62510/62511/62512 as shipped, see OAxFORTIS_registry.py). Run OAxFORTIS_datacollect.py with --local to have it accept
+those same addresses.
+
+INSTRUCTIONS:
+                python3 OAxFORTIS_replay.py <journal name or event files ...> [--speed N] [--target HOST:PORT] [--map TDC=LOCAL ...]
+    --speed 1 (default) keeps the original timing, --speed 10 plays 10x faster, --speed 0 sends as fast as possible.
+    --map 192.168.1.10:62510=127.0.0.1:7000 changes where a TDC role is sent from (can be given several times).
+    --sources FILE takes the local addresses from another source table's aliases.
+    --loop N plays the whole thing N times.
+    A journal is given by name without extension (e.g. ./2024-03-09/raw_test1).
+
+OUTPUT: a summary of packets/s and MB/s actually sent.
+'''
+
+import os
+import sys
+import time
+import socket
+import argparse
+import numpy as np
+from OAxFORTIS_decode import PACKET_WORDS, HEADER_WORDS, MAX_EVENTS
+from OAxFORTIS_registry import Registry, SOURCES_FILE, parse_address
+from OAxFORTIS_load import parse_rows
+
+# the TDCs, as they appear on the flight network (see OAxFORTIS_registry.py)
+TDC_ADDRESSES = {src.order: src.address for src in Registry.load()}
+
+
+def local_sources(path=SOURCES_FILE):
+    '''Where each TDC role is sent from when replaying on one machine: {TDC address: local address}, from the table's aliases.'''
+    return Registry.load(path).stand_ins()
+
+
+def load_event_file(path):
+    '''Read an event file into (packetnum, time, X, Y, P, num photons) columns. Handles tab or comma csv and .evt stores.'''
+    if path.endswith('.evt'):
+        from OAxFORTIS_eventstore import read_rows
+        rows = read_rows(path[:-4])
+        return [rows[name] for name in rows.dtype.names]
+    rows = parse_rows(path)
+    return [rows[name] for name in rows.dtype.names]
+
+
+def synthesize(path):
+    '''
+    Rebuild 1458-byte TDC packets from an event file. Returns (packets as bytes, time stamps, TDC address) - the TDC is
+    picked from the file name (Zero_/Pos1_/Neg1_). The photon count word is set to the number of rows the packet has in
+    the file (older files don't always agree with their num photons column), so the same events come back out.
+    '''
+    order = os.path.basename(path)[:4]
+    if order not in TDC_ADDRESSES:
+        raise ValueError('{}: file name should start with Zero_, Pos1_ or Neg1_'.format(path))
+    packetnum, times, X, Y, P, _ = load_event_file(path)
+    if len(times) == 0:
+        return [], np.zeros(0), TDC_ADDRESSES[order]
+    new = np.ones(len(times), dtype=bool)
+    new[1:] = (packetnum[1:] != packetnum[:-1]) | (times[1:] != times[:-1])
+    starts = np.flatnonzero(new)
+    ends = np.append(starts[1:], len(times))
+
+    packets = []
+    for a, b in zip(starts, ends):
+        b = min(b, a + MAX_EVENTS)
+        words = np.zeros(PACKET_WORDS, dtype='<u2')
+        words[0] = b - a
+        words[1] = packetnum[a]
+        events = words[HEADER_WORDS:HEADER_WORDS + 3*(b-a)]
+        events[0::3] = X[a:b]
+        events[1::3] = Y[a:b]
+        events[2::3] = P[a:b]
+        packets.append(words.tobytes())
+    return packets, np.asarray(times[starts], dtype=float), TDC_ADDRESSES[order]
+
+
+def load_traffic(inputs):
+    '''Everything to send, merged in time order: (list of packet bytes, time stamps, list of TDC addresses).'''
+    packets, times, sources = [], [], []
+    for name in inputs:
+        if os.path.exists(name + '.jdx'):
+            from OAxFORTIS_journal import read_packets
+            for data, address, mono, _ in read_packets(name):
+                packets.append(data)
+                times.append(mono)
+                sources.append(address)
+        else:
+            p, t, address = synthesize(name)
+            packets += p
+            times += list(t)
+            sources += [address] * len(p)
+    order = np.argsort(np.asarray(times, dtype=float), kind='stable')
+    return [packets[i] for i in order], np.asarray(times, dtype=float)[order], [sources[i] for i in order]
+
+
+def replay(packets, times, sources, target, mapping, speed=1.0, loops=1):
+    '''Send the packets to target from the mapped local addresses, paced by their time stamps / speed (speed 0 = flat out).'''
+    sockets = {}
+    for address in set(sources):
+        local = mapping.get(address, address)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(local)
+        sockets[address] = sock
+
+    sent = 0
+    nbytes = 0
+    rel = times - times[0] if len(times) else times
+    span = rel[-1] if len(rel) else 0.
+    start = time.monotonic()
+    for loop in range(loops):
+        for i, data in enumerate(packets):
+            if speed > 0:
+                due = start + (loop*span + rel[i])/speed
+                wait = due - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            sockets[sources[i]].sendto(data, target)
+            sent += 1
+            nbytes += len(data)
+    elapsed = time.monotonic() - start
+    for sock in sockets.values():
+        sock.close()
+    return sent, nbytes, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay OAxFORTIS TDC traffic to a local UDP port.')
+    parser.add_argument('inputs', nargs='+', help='journal name(s) (without .jrn/.jdx) and/or Zero_/Pos1_/Neg1_ event files')
+    parser.add_argument('--target', type=parse_address, default=('127.0.0.1', 60000), help='where to send packets (default 127.0.0.1:60000)')
+    parser.add_argument('--speed', type=float, default=1.0, help='1 = real time, N = N times faster, 0 = as fast as possible')
+    parser.add_argument('--map', action='append', default=[], metavar='TDC=LOCAL', help='send TDC role from LOCAL address, e.g. 192.168.1.10:62510=127.0.0.1:7000')
+    parser.add_argument('--loop', type=int, default=1, help='play everything this many times')
+    parser.add_argument('--sources', default=SOURCES_FILE, help='JSON source table whose aliases are the local addresses to send from (default OAxFORTIS_sources.json)')
+    args = parser.parse_args()
+
+    mapping = local_sources(args.sources)
+    for item in args.map:
+        tdc, local = item.split('=')
+        mapping[parse_address(tdc)] = parse_address(local)
+
+    packets, times, sources = load_traffic(args.inputs)
+    print('Replaying {} packets to {}:{} ...'.format(len(packets), *args.target))
+    try:
+        sent, nbytes, elapsed = replay(packets, times, sources, args.target, mapping, args.speed, args.loop)
+    except KeyboardInterrupt:
+        sys.exit(1)
+    print('Sent {} packets in {:.2f}s: {:.0f} packets/s, {:.2f} MB/s'.format(sent, elapsed, sent/max(elapsed, 1e-9), nbytes/max(elapsed, 1e-9)/1e6))
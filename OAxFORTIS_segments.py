@@ -0,0 +1,199 @@
+'''
+Created: 10/18/2026
+
+Segmented output for long runs. Instead of one ever growing Zero_<modifier>.csv (or .evt/.pkt store), an order is written
+as a series of segments that are closed and replaced when they reach a size or a time span:
+    Zero_<modifier>_s000.csv, Zero_<modifier>_s001.csv, ...     (or Zero_<modifier>_s000.evt/.pkt, ...)
+plus a small manifest, Zero_<modifier>.segments.json, listing every segment in order with its time span (first/last packet
+time stamp), packet number range, number of packets and events, and size. The manifest is rewritten (atomically) whenever
+a segment is started or closed, and at most once a second while one is being written (listed with "closed": false and the
+span so far).
+
+A run can then be read as one dataset (read_rows/read_table with no times) or, for a time window, only the segments that
+overlap it are opened. Each segment has its own packet summary (Zero_<modifier>_s000.pks, ..., see OAxFORTIS_eventstore.py),
+read the same way with read_summary. To see a run's segments:
+                python3 OAxFORTIS_segments.py <folder>/Zero_<modifier>
+'''
+
+import os
+import sys
+import json
+import time
+import numpy as np
+from OAxFORTIS_decode import ROW_DTYPE
+from OAxFORTIS_eventstore import EventStore, SUMMARY_RECORD, packet_starts, read_rows as read_store, read_summary as read_store_summary
+from OAxFORTIS_writers import CsvSink
+from OAxFORTIS_load import parse_rows
+
+
+def manifest_path(base):
+    return base + '.segments.json'
+
+
+def load_manifest(base):
+    '''Segments of a run in order (list of dicts), [] if it wasn't written in segments.'''
+    if not os.path.exists(manifest_path(base)):
+        return []
+    with open(manifest_path(base)) as f:
+        return json.load(f)['segments']
+
+
+class SegmentedSink:
+    '''
+    Sink for OAxFORTIS_writers.GroupCommitWriter taking ROW_DTYPE rows. kind is 'csv' or 'evt' (binary event store).
+    A new segment is started before a batch once the current one holds max_bytes or spans max_seconds of time stamps
+    (either may be None). A batch is never split across segments. With summary=True every segment keeps a packet summary.
+    '''
+    def __init__(self, base, kind='csv', max_bytes=None, max_seconds=None, delimiter=',', summary=False):
+        self.base = base
+        self.kind = kind
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.delimiter = delimiter
+        self.summary = summary
+        self.segments = load_manifest(base) # carries on after an earlier run with the same name
+        for seg in self.segments:
+            seg['closed'] = True
+        self.sink = None
+        self.current = None
+        self.saved = 0. # time.monotonic() of the last manifest write
+
+    def _open(self):
+        name = '{}_s{:03d}'.format(os.path.basename(self.base), len(self.segments))
+        path = os.path.join(os.path.dirname(self.base), name)
+        if self.kind == 'evt':
+            self.sink = EventStore(path, summary=self.summary)
+            name += '.evt'
+        else:
+            self.sink = CsvSink(path + '.csv', delimiter=self.delimiter, summary=self.summary)
+            name += '.csv'
+        self.current = {'file': name, 'first_time': None, 'last_time': None, 'first_packet': None, 'last_packet': None,
+                        'packets': 0, 'events': 0, 'bytes': 0, 'closed': False}
+        self.segments.append(self.current)
+        self._save()
+
+    def _rotate(self):
+        self.sink.flush()
+        self.sink.sync()
+        self.sink.close()
+        self.current['closed'] = True
+        self.sink = None
+        self._open()
+
+    def write(self, rows, summary=None):
+        if len(rows) == 0 and summary is None:
+            return 0
+        if self.sink is None:
+            self._open()
+        if len(rows) == 0: # packets without events only go in the current segment's summary
+            return self.sink.write(rows, summary)
+        seg = self.current
+        if seg['events'] and ((self.max_bytes is not None and seg['bytes'] >= self.max_bytes) or
+                              (self.max_seconds is not None and rows['time'][-1] - seg['first_time'] >= self.max_seconds)):
+            self._rotate()
+            seg = self.current
+        nbytes = self.sink.write(rows) if summary is None else self.sink.write(rows, summary)
+        starts = packet_starts(rows)
+        if seg['first_time'] is None:
+            seg['first_time'] = float(rows['time'][0])
+            seg['first_packet'] = int(rows['packetnum'][0])
+        seg['last_time'] = float(rows['time'][-1])
+        seg['last_packet'] = int(rows['packetnum'][-1])
+        seg['packets'] += len(starts)
+        seg['events'] += len(rows)
+        seg['bytes'] += nbytes
+        return nbytes
+
+    def _save(self):
+        self.saved = time.monotonic()
+        tmp = manifest_path(self.base) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'base': os.path.basename(self.base), 'kind': self.kind, 'segments': self.segments}, f, indent=1)
+        os.replace(tmp, manifest_path(self.base))
+
+    def flush(self):
+        if self.sink is not None:
+            self.sink.flush()
+            if time.monotonic() - self.saved >= 1: # keep the open segment's span current, but not on every flush
+                self._save()
+
+    def sync(self):
+        if self.sink is not None: # nothing to sync between segments - don't start an empty one for it
+            self.sink.sync()
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+            self.current['closed'] = True
+            self.sink = None
+        self._save()
+
+
+def segments_between(base, t0=None, t1=None):
+    '''Manifest entries of the segments with any packets time stamped in [t0, t1] (None = open ended).'''
+    chosen = []
+    for seg in load_manifest(base):
+        if seg['first_time'] is None:
+            continue
+        last = seg['last_time'] if seg['closed'] else np.inf # still being written, may have grown since
+        if (t0 is None or last >= t0) and (t1 is None or seg['first_time'] <= t1):
+            chosen.append(seg)
+    return chosen
+
+
+def read_segment(base, seg):
+    '''ROW_DTYPE rows of one segment.'''
+    path = os.path.join(os.path.dirname(base), seg['file'])
+    if path.endswith('.evt'):
+        return read_store(path[:-4])
+    return parse_rows(path)
+
+
+def read_rows(base, t0=None, t1=None):
+    '''Rows of a segmented run with time stamps in [t0, t1] (None = open ended), reading only the segments that overlap.'''
+    parts = [read_segment(base, seg) for seg in segments_between(base, t0, t1)]
+    rows = np.concatenate(parts) if parts else np.zeros(0, dtype=ROW_DTYPE)
+    if t0 is not None:
+        rows = rows[rows['time'] >= t0]
+    if t1 is not None:
+        rows = rows[rows['time'] <= t1]
+    return rows
+
+
+def read_summary(base, t0=None, t1=None):
+    '''
+    Packet summary (OAxFORTIS_eventstore.SUMMARY_RECORD) of the packets time stamped in [t0, t1] (None = open ended), from
+    the segments that overlap it - or of a run written in one piece, <base>.pks. offset is into each packet's own segment.
+    '''
+    segments = load_manifest(base)
+    if not segments:
+        summary = read_store_summary(base)
+    else:
+        parts = [read_store_summary(os.path.join(os.path.dirname(base), os.path.splitext(seg['file'])[0])) for seg in segments_between(base, t0, t1)]
+        summary = np.concatenate(parts) if parts else np.zeros(0, dtype=SUMMARY_RECORD)
+    if t0 is not None:
+        summary = summary[summary['time'] >= t0]
+    if t1 is not None:
+        summary = summary[summary['time'] <= t1]
+    return summary
+
+
+def read_table(base, t0=None, t1=None):
+    '''Same float64 matrix np.loadtxt gives for a single CSV (columns: packet num, time, X, Y, P, num photons).'''
+    rows = read_rows(base, t0, t1)
+    return np.column_stack([rows[name].astype(float) for name in ROW_DTYPE.names]) if len(rows) else np.zeros((0, len(ROW_DTYPE.names)))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("Run like : python3 OAxFORTIS_segments.py <arg1:folder/order_modifier (ex: 2024-03-09/Zero_test1)>")
+        exit(1)
+    segments = load_manifest(sys.argv[1])
+    if not segments:
+        print('No segment manifest for {}'.format(sys.argv[1]))
+    for seg in segments:
+        if seg['first_time'] is None:
+            print('{:>24}  (empty)'.format(seg['file']))
+            continue
+        print('{file:>24}  t {first_time:>10.3f} - {last_time:>10.3f} s  packets #{first_packet}-#{last_packet} ({packets})  {events} events  {bytes} bytes'.format(**seg)
+              + ('' if seg['closed'] else '  (open)'))
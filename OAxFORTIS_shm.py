@@ -0,0 +1,221 @@
+'''
+Created: 10/18/2026
+
+Live histograms in shared memory, so other processes can watch an acquisition without going through its plot window.
+
+OAxFORTIS_datacollect.py creates a multiprocessing.shared_memory segment (default name "OAxFORTIS_live") holding, for every
+order, the histograms of its OAxFORTIS_hist.OrderAccumulator - the accumulator adds events straight into the segment, so
+publishing costs the receiver nothing extra - plus its count rates and packet counters:
+    header  magic, sequence number, last update time, number of orders, the receiver's process id, and a JSON description
+            of the orders (order, label, range) and the histogram shapes
+    orders  one record per order: grid (2D X/Y image), xproj, yproj, ph (pulse heights), events, rate, ewma (smoothed
+            rate), packets, missing (lost packets), kernel_drops (whole receiver, same for every order)
+The sequence number is a seqlock: the receiver makes it odd before changing anything and even again after. A viewer reads
+the number, reads what it wants, and checks the number again - if it was odd or has changed, the frame was torn and it reads
+again. Viewers never write to the segment and the receiver never waits for them.
+
+Any number of viewers can attach by name (LiveViewer). Run this file for a ready made one:
+                python3 OAxFORTIS_shm.py [--name NAME] [--every S] [--dump FOLDER] [--plot]
+    prints each order's rate and counts every S seconds (default 2), --dump also saves every frame to FOLDER as
+    live_<time>.npz, and --plot shows a quick-look window of the 2D histograms.
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+DEFAULT_NAME = 'OAxFORTIS_live'
+MAGIC = b'OAXLIVE2'
+META_BYTES = 8192
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('seq', '<u8'), ('time', '<f8'), ('norders', '<u4'), ('meta_len', '<u4'), ('pid', '<u4'), ('meta', 'S%d'%META_BYTES)])
+HISTOGRAMS = ('grid', 'xproj', 'yproj', 'ph')
+
+
+def order_dtype(bins=(355,355), proj_bins=1000, ph_bins=256):
+    '''Layout of one order's record in the segment.'''
+    return np.dtype([('grid', '<u4', tuple(bins)), ('xproj', '<u8', proj_bins), ('yproj', '<u8', proj_bins), ('ph', '<u8', ph_bins),
+                     ('events', '<u8'), ('rate', '<f8'), ('ewma', '<f8'), ('packets', '<u8'), ('missing', '<u8'), ('kernel_drops', '<u8')], align=True)
+
+
+class LivePublisher:
+    '''
+    The receiver's side: creates the segment and owns it until close(). A segment of the same name left by a crashed run
+    is replaced, but one whose receiver is still running is not - that raises FileExistsError.
+    '''
+    def __init__(self, sources, name=DEFAULT_NAME, bins=(355,355), proj_bins=1000):
+        self.record = order_dtype(bins, proj_bins)
+        meta = json.dumps({'orders': [{'order': s.order, 'label': s.label, 'range': s.range} for s in sources],
+                           'bins': list(bins), 'proj_bins': proj_bins}).encode()
+        if len(meta) > META_BYTES:
+            raise ValueError('too many sources to describe in the shared memory header')
+        size = HEADER_DTYPE.itemsize + len(sources)*self.record.itemsize
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            existing = attach(name)
+            pid = owner(existing)
+            existing.close()
+            if pid is not None and running(pid):
+                raise FileExistsError('shared memory {} is in use by process {} (another OAxFORTIS_datacollect.py?) - stop it '
+                                      'or give this one another --shm name'.format(name, pid))
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        self.name = name
+        self.header = np.ndarray((), HEADER_DTYPE, buffer=self.shm.buf)
+        self.header['pid'] = os.getpid()
+        self.orders = np.ndarray(len(sources), self.record, buffer=self.shm.buf, offset=HEADER_DTYPE.itemsize)
+        self.orders[...] = np.zeros((), self.record)
+        self.header['seq'] = 0
+        self.header['time'] = time.time()
+        self.header['norders'] = len(sources)
+        self.header['meta_len'] = len(meta)
+        self.header['meta'] = meta
+        self.header['magic'] = MAGIC # last, so a viewer never sees a half written header as valid
+
+    def buffers(self, k):
+        '''Order k's histograms in the segment, to pass to OrderAccumulator(out=...).'''
+        return {field: self.orders[field][k] for field in HISTOGRAMS}
+
+    def begin(self):
+        '''Start changing the segment (viewers will retry until end()).'''
+        self.header['seq'] += 1
+
+    def end(self):
+        self.header['time'] = time.time()
+        self.header['seq'] += 1
+
+    def close(self):
+        del self.header, self.orders # numpy views have to go before the buffer can be released
+        self.shm.close()
+        self.shm.unlink()
+
+
+def attach(name):
+    '''Open an existing segment without taking ownership of it (it stays when this process exits).'''
+    try:
+        return shared_memory.SharedMemory(name, track=False) # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(shm._name, 'shared_memory') # or the tracker would remove it when this viewer exits
+        return shm
+
+
+def owner(shm):
+    '''Process id of the receiver that made a segment, or None if it isn't one of ours (or predates the pid field).'''
+    if shm.size < HEADER_DTYPE.itemsize:
+        return None
+    header = np.ndarray((), HEADER_DTYPE, buffer=shm.buf)
+    pid = int(header['pid']) if bytes(header['magic']) == MAGIC else None
+    del header
+    return pid or None
+
+
+def running(pid):
+    '''True if process pid exists (on Windows a segment only outlives its last user if that user is still running).'''
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError: # someone else's
+        return True
+    return True
+
+
+class LiveViewer:
+    '''Read-only view of a segment made by LivePublisher.'''
+    def __init__(self, name=DEFAULT_NAME):
+        self.shm = attach(name)
+        self.header = np.ndarray((), HEADER_DTYPE, buffer=self.shm.buf)
+        if bytes(self.header['magic']) != MAGIC:
+            raise ValueError('{} is not an OAxFORTIS live histogram segment (or is still being set up)'.format(name))
+        meta = json.loads(bytes(self.header['meta'])[:int(self.header['meta_len'])])
+        self.sources = meta['orders']
+        self.orders = np.ndarray(int(self.header['norders']), order_dtype(meta['bins'], meta['proj_bins']), buffer=self.shm.buf, offset=HEADER_DTYPE.itemsize)
+        self.orders.flags.writeable = False
+        self.header.flags.writeable = False
+
+    def begin(self):
+        '''Sequence number to pass to retry() once done reading self.orders in place. Waits out a change in progress.'''
+        while True:
+            seq = int(self.header['seq'])
+            if seq % 2 == 0:
+                return seq
+            time.sleep(0)
+
+    def retry(self, seq):
+        '''True if the segment changed since begin() returned seq, i.e. what was read may be torn.'''
+        return int(self.header['seq']) != seq
+
+    def snapshot(self):
+        '''(update time, copy of every order record) from one consistent frame.'''
+        while True:
+            seq = self.begin()
+            orders = self.orders.copy()
+            updated = float(self.header['time'])
+            if not self.retry(seq):
+                return updated, orders
+
+    def close(self):
+        del self.header, self.orders
+        self.shm.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Watch the live histograms of a running OAxFORTIS_datacollect.py.')
+    parser.add_argument('--name', default=DEFAULT_NAME, help='shared memory segment name (default %s)'%DEFAULT_NAME)
+    parser.add_argument('--every', type=float, default=2., help='seconds between frames (default 2)')
+    parser.add_argument('--dump', default=None, metavar='FOLDER', help='save every frame to FOLDER/live_<time>.npz')
+    parser.add_argument('--plot', action='store_true', help='show the 2D histograms in a quick-look window')
+    args = parser.parse_args()
+
+    try:
+        viewer = LiveViewer(args.name)
+    except FileNotFoundError:
+        print('No live segment called {} - is OAxFORTIS_datacollect.py running?'.format(args.name))
+        sys.exit(1)
+    if args.dump and not os.path.isdir(args.dump):
+        os.makedirs(args.dump)
+    if args.plot:
+        import matplotlib.pyplot as plt
+        from matplotlib import colors
+        fig, axes = plt.subplots(1, len(viewer.sources), figsize=(5*len(viewer.sources), 4.5), squeeze=False)
+        images = []
+        for ax, src in zip(axes[0], viewer.sources):
+            ax.set_title(src['label'])
+            images.append(ax.imshow(np.ones((10, 10)), interpolation='nearest', cmap='magma', norm=colors.LogNorm(), origin='lower', aspect='auto',
+                                    extent=[src['range'][0][0], src['range'][0][1], src['range'][1][0], src['range'][1][1]]))
+        plt.show(block=False)
+
+    last_seen = None
+    try:
+        while True:
+            updated, orders = viewer.snapshot()
+            if updated != last_seen:
+                last_seen = updated
+                print(time.strftime('%H:%M:%S', time.localtime(updated)) + '  ' + ' | '.join('%s %.0f counts/s %d events %d packets (%d lost)'%(
+                    src['label'], o['rate'], o['events'], o['packets'], o['missing']) for src, o in zip(viewer.sources, orders)) + '  kernel drops %d'%orders['kernel_drops'].max())
+                if args.dump:
+                    np.savez(os.path.join(args.dump, 'live_%.3f.npz'%updated), **{'{}_{}'.format(src['order'], field): orders[field][k]
+                             for k, src in enumerate(viewer.sources) for field in orders.dtype.names})
+                if args.plot:
+                    for image, o in zip(images, orders):
+                        image.set_data(o['grid'].T)
+                        image.autoscale()
+            if args.plot:
+                if not plt.fignum_exists(fig.number):
+                    break
+                plt.pause(args.every)
+            else:
+                time.sleep(args.every)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        viewer.close()
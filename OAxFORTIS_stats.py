@@ -0,0 +1,162 @@
+'''
+Created: 10/18/2026
+
+Receive path instrumentation for OAxFORTIS_datacollect.py.
+
+SequenceTracker follows the packet number (2nd word of every packet) of one TDC. The counter is 16 bits and wraps at 65536,
+so each packet number is unwrapped against the previous one before comparing. For every packet it decides:
+    next expected number        -> in order
+    ahead of the next expected  -> gap (the numbers skipped over are counted as missing)
+    same as the highest so far  -> duplicate
+    behind the highest so far   -> reordered if that number hadn't arrived yet (a late packet - it was counted missing, so
+                                   missing goes back down), duplicate if it had
+Which of the last SEQ_WINDOW numbers have arrived is kept in a bitmap, so a replayed or duplicated burst can't hide real
+loss. A packet more than SEQ_WINDOW behind can't be told apart and counts as a duplicate (what it filled stays missing).
+It also keeps an inter-arrival time histogram and a smoothed jitter (RFC 3550 style running mean of how much each
+inter-arrival time differs from the one before).
+
+LatencyHistogram is a log-binned histogram of durations (1us - 100s) used for the inter-arrival times and for the per batch
+decode and write times, with cheap percentile lookup.
+
+All updates work on a whole batch of packets at once.
+
+After a run, the same checks (and the average count rate) come straight from an output's packet summary (see
+OAxFORTIS_eventstore.py) without reading a single event:
+                python3 OAxFORTIS_stats.py <folder>/Zero_<modifier> [start end]
+'''
+
+import sys
+import numpy as np
+
+SEQ_MODULUS = 1 << 16
+SEQ_WINDOW = 1 << 15 # packet numbers remembered behind the highest (further back can't be unwrapped as behind anyway)
+
+
+class LatencyHistogram:
+    def __init__(self, lo=1e-6, hi=100., bins_per_decade=20):
+        self.edges = np.logspace(np.log10(lo), np.log10(hi), int(round(np.log10(hi/lo)*bins_per_decade)) + 1)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64) # first/last bins catch under/overflow
+        self.total = 0.
+        self.n = 0
+
+    def add(self, seconds):
+        seconds = np.atleast_1d(np.asarray(seconds, dtype=float))
+        if len(seconds) == 0:
+            return
+        self.counts += np.bincount(np.searchsorted(self.edges, seconds), minlength=len(self.counts))
+        self.total += seconds.sum()
+        self.n += len(seconds)
+
+    def mean(self):
+        return self.total/self.n if self.n else 0.
+
+    def percentile(self, q):
+        '''Upper edge of the bin holding the q-th percentile (0-100).'''
+        if self.n == 0:
+            return 0.
+        i = int(np.searchsorted(np.cumsum(self.counts), q/100*self.n))
+        return self.edges[min(i, len(self.edges) - 1)]
+
+
+class SequenceTracker:
+    def __init__(self):
+        self.highest = None # highest unwrapped packet number seen
+        self.last = None    # unwrapped packet number of the previous packet
+        self.first = None   # unwrapped packet number of the first packet
+        self.arrived = np.zeros(SEQ_WINDOW, dtype=bool) # arrived[n % SEQ_WINDOW] for n in (highest - SEQ_WINDOW, highest]
+        self.last_arrival = None
+        self.last_interval = None
+        self.packets = 0
+        self.missing = 0
+        self.gaps = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.jitter = 0.
+        self.interarrival = LatencyHistogram()
+
+    def update(self, packetnums, arrivals):
+        '''packetnums: packet number of each packet from this TDC in receive order, arrivals: their time.monotonic() stamps.'''
+        packetnums = np.asarray(packetnums, dtype=np.int64)
+        arrivals = np.asarray(arrivals, dtype=float)
+        if len(packetnums) == 0:
+            return
+        if self.last is None:
+            self.last = self.highest = int(packetnums[0]) - 1
+            self.first = int(packetnums[0])
+
+        # unwrap: each step is the signed difference from the previous packet, in -32768..32767
+        prev = np.empty_like(packetnums)
+        prev[0] = self.last % SEQ_MODULUS
+        prev[1:] = packetnums[:-1]
+        step = (packetnums - prev + SEQ_MODULUS//2) % SEQ_MODULUS - SEQ_MODULUS//2
+        seq = self.last + np.cumsum(step)
+        highest = np.maximum.accumulate(np.append(self.highest, seq))
+        before = highest[:-1] # highest number seen before each packet
+
+        ahead = seq - before
+        self.gaps += int(np.count_nonzero(ahead > 1))
+        self.missing += int(ahead[ahead > 1].sum() - np.count_nonzero(ahead > 1))
+
+        # a packet behind the highest fills a gap only if its number is in the window and hasn't arrived before - neither
+        # in an earlier batch (the bitmap) nor earlier in this one
+        _, first_index, inverse = np.unique(seq, return_index=True, return_inverse=True)
+        new = first_index[inverse.reshape(-1)] == np.arange(len(seq))
+        known = (seq <= self.highest) & (seq > self.highest - SEQ_WINDOW)
+        new[known] &= ~self.arrived[seq[known] % SEQ_WINDOW]
+        late = (ahead < 0) & new & (seq > before - SEQ_WINDOW)
+        self.reordered += int(np.count_nonzero(late))
+        self.missing -= int(np.count_nonzero(late & (seq >= self.first))) # before the first packet was never counted missing
+        self.duplicates += int(np.count_nonzero((ahead <= 0) & ~late))
+
+        top = int(highest[-1])
+        if top - self.highest >= SEQ_WINDOW:
+            self.arrived[:] = False
+        else:
+            self.arrived[np.arange(self.highest + 1, top + 1) % SEQ_WINDOW] = False # numbers newly in the window
+        recent = seq > top - SEQ_WINDOW
+        self.arrived[seq[recent] % SEQ_WINDOW] = True
+        self.packets += len(seq)
+        self.last = int(seq[-1])
+        self.highest = top
+
+        intervals = np.diff(arrivals if self.last_arrival is None else np.append(self.last_arrival, arrivals))
+        self.last_arrival = arrivals[-1]
+        if len(intervals) == 0:
+            return
+        self.interarrival.add(intervals)
+        if self.last_interval is not None:
+            intervals = np.append(self.last_interval, intervals)
+        for d in np.abs(np.diff(intervals)): # J += (|D| - J)/16, only a handful of packets per batch
+            self.jitter += (d - self.jitter)/16
+        self.last_interval = intervals[-1]
+
+    def loss_fraction(self):
+        expected = self.packets - self.duplicates + self.missing
+        return self.missing/expected if expected else 0.
+
+    def summary(self):
+        return 'lost %d (%.2f%%) gaps %d dup %d reord %d jitter %.1fms'%(self.missing, 100*self.loss_fraction(), self.gaps, self.duplicates, self.reordered, 1e3*self.jitter)
+
+
+def summary_tracker(summary):
+    '''A SequenceTracker run over a packet summary (OAxFORTIS_eventstore.SUMMARY_RECORD), time stamps standing in for arrival times.'''
+    tracker = SequenceTracker()
+    tracker.update(summary['packetnum'], summary['time'])
+    return tracker
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 4):
+        print("Run like : python3 OAxFORTIS_stats.py <arg1:folder/order_modifier (ex: 2024-03-09/Zero_test1)> [<arg2:start time (s)> <arg3:end time (s)>]")
+        exit(1)
+    from OAxFORTIS_segments import read_summary
+    window = (float(sys.argv[2]), float(sys.argv[3])) if len(sys.argv) == 4 else (None, None)
+    summary = read_summary(sys.argv[1], *window)
+    if len(summary) == 0:
+        print('No packet summary for {}'.format(sys.argv[1]))
+        exit(1)
+    span = summary['time'][-1] - summary['time'][0]
+    events = int(summary['count'].sum())
+    print('{} packets, {} events in {:.1f} s ({:.1f} counts/s), {} packets with events'.format(len(summary), events, span, events/span if span > 0 else 0.,
+                                                                                              np.count_nonzero(summary['count'])))
+    print(summary_tracker(summary).summary())
@@ -0,0 +1,62 @@
+'''
+Created: 10/18/2026
+
+Going through a whole run a chunk at a time, for runs too big to hold in memory (multi-hour chamber runs are several GB).
+
+iter_run yields a run as consecutive OAxFORTIS_eventstore.EventTable chunks whichever way it was written - one csv (through
+its .rows cache, see OAxFORTIS_load.py), a binary .evt/.pkt store, or segments (OAxFORTIS_segments.py, only those covering
+the time window) - and histogram_run reads it once, adding every chunk to an order's OAxFORTIS_hist.PlotHistograms (X/Y
+image, projections and pulse heights all at once) before moving on to the next. Memory is a chunk (CHUNK_BYTES of csv, or
+CHUNK_EVENTS events of a binary file or cache) plus the histograms (about 1MB an order), and one 24-byte record per packet
+if the packet records are wanted too - the same for a ten minute run as for a ten hour one.
+'''
+
+import os
+import numpy as np
+from OAxFORTIS_eventstore import EventTable, CHUNK_EVENTS, join_packets
+from OAxFORTIS_segments import load_manifest, segments_between
+from OAxFORTIS_load import iter_tables
+
+CHUNK_BYTES = 1 << 22 # of csv per chunk - parsing takes ~20 bytes of memory per byte, so this keeps a pass under ~100MB
+
+
+def _tables(path, chunk_bytes):
+    if path.endswith('.evt'):
+        return EventTable.open(path[:-len('.evt')]).chunks(CHUNK_EVENTS)
+    return iter_tables(path, chunk_bytes=chunk_bytes)
+
+
+def iter_run(base, t0=None, t1=None, chunk_bytes=CHUNK_BYTES):
+    '''
+    EventTables of consecutive chunks of the run written as base (e.g. ./Zero_<modifier>), with only the packets time
+    stamped in [t0, t1] (None = open ended). Nothing if there's no such run.
+    '''
+    segments = load_manifest(base)
+    if segments:
+        paths = [os.path.join(os.path.dirname(base), seg['file']) for seg in segments_between(base, t0, t1)]
+    elif os.path.exists(base + '.evt'):
+        paths = [base + '.evt']
+    elif os.path.exists(base + '.csv') and os.path.getsize(base + '.csv') > 0:
+        paths = [base + '.csv']
+    else:
+        paths = []
+    for path in paths:
+        for table in _tables(path, chunk_bytes):
+            if t0 is not None or t1 is not None:
+                table = table.between(t0, t1)
+            if len(table.packets):
+                yield table
+
+
+def histogram_run(base, hists, t0=None, t1=None, packets=True, chunk_bytes=CHUNK_BYTES):
+    '''
+    Add every event of a run (see iter_run) to hists (a PlotHistograms) in one pass. Returns the run's packet records
+    (PACKET_RECORD, first counting from the run's first event) - or None with packets=False, when they aren't needed.
+    '''
+    parts = []
+    for table in iter_run(base, t0, t1, chunk_bytes):
+        events = table.events
+        hists.add(events['X'], events['Y'], events['P'])
+        if packets:
+            parts.append(np.array(table.packets))
+    return join_packets(parts) if packets else None
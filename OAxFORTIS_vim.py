@@ -0,0 +1,463 @@
+'''
+Created: 10/18/2026
+
+Bulk parser for the packet dumps downloaded from the VIM (tdc_N/N_data-#.csv, used by OAxFORTIS_VIM2CSV.py).
+
+Every line of a dump is one TDC packet, tab separated:
+    <index>    <time stamp (s)>    [w0, w1, ..., w728]
+where the bracketed list is the packet's 729 decoded words (see OAxFORTIS_decode.py). Rather than turning every line into
+Python strings and parsing each list on its own, the file is read as bytes in big chunks and each chunk is taken apart with
+vectorized scans over its bytes (brackets, then tabs): all its time stamps and all its word lists are cut out at once and
+parsed by numpy in one call each into a (packets x 729) array, which becomes a PACKET_DTYPE array and is expanded into event
+rows in one vectorized pass (OAxFORTIS_decode.expand_events), ready to be written in one go.
+
+MEMORY: only one chunk is ever held, so memory use is set by the chunk size, not by the size of the dump. A chunk needs
+about MEMORY_PER_BYTE times its size at its peak (text, words, event rows and their csv text together), so --max-mb M
+(default 512) picks chunks of M/MEMORY_PER_BYTE MB (shared between the workers in batch mode). Each chunk goes
+    read -> decode -> drop packets with fewer than 2 events -> write -> add to the running QuickLook histograms
+and the QuickLook histograms are what OAxFORTIS_VIM2CSV.py plots, so the output is never read back in (except for dumps
+converted on an earlier run, which are read back from the output a chunk at a time).
+
+BATCH MODE: after a flight there are dozens of dumps. This converts every set that hasn't been processed yet, without any
+prompts, spreading the orders and file numbers over a pool of processes:
+                python3 OAxFORTIS_VIM2CSV.py <folder with tdc_0/1/2> [--today | --folder NAME] [--jobs N] [--max-mb M]
+    (or the same arguments to python3 OAxFORTIS_vim.py). A set is a file number with a tdc_N/N_data-#.csv dump in any of
+    the three folders; missing dumps count as empty. Output goes next to the VIM folder, as OAxFORTIS_VIM2CSV.py does:
+    ../<today's date> with --today, ../<NAME> with --folder, ../UnknownDate otherwise. Once all three orders of a set are
+    written, its dumps are renamed to N_data-#processed.csv; a set that failed is left as it was to be run again. Ends with
+    a summary of events, MB/s and events/s for every dump.
+
+MANIFEST: every output folder has a VIM_manifest.json recording, for each dump converted into it (by its tdc_N/N_data-#.csv
+name), the dump's size, modification time and SHA-256, the output file, the byte range of the output it wrote (and of the
+output's packet summary, <order>_VIM#<number>.pks - every packet of the dump, see OAxFORTIS_eventstore.py), how far into
+the dump it got and how many events it wrote. Progress is recorded after every chunk, once that chunk's events are synced
+to disk. So converting a dump again (interactively or in batch mode, crashed or not) never duplicates events:
+    finished, dump unchanged      skipped straight away (size and mtime match - or, if only those changed, the hash does)
+    unfinished, dump unchanged    the output is cut back to the last recorded chunk and conversion carries on from there
+    dump has changed              its part of the output is cut off and converted again from the start
+'''
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import datetime
+import contextlib
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from OAxFORTIS_decode import PACKET_WORDS, PACKET_DTYPE, expand_events
+from OAxFORTIS_writers import CsvSink, summary_path
+from OAxFORTIS_eventstore import EventTable, PACKET_RECORD, packet_summary
+from OAxFORTIS_load import iter_rows
+from OAxFORTIS_hist import PlotHistograms, PH_EDGES
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+ORDERS = ((0, 'Zero'), (1, 'Pos1'), (2, 'Neg1')) # tdc folder number and output file prefix
+DUMP_NAME = re.compile(r'^([012])_data-(\d+)\.csv$') # unprocessed dumps only, processed ones end in "processed.csv"
+
+MANIFEST = 'VIM_manifest.json'
+
+MEMORY_PER_BYTE = 16 # peak memory per byte of dump text in a chunk (measured ~14)
+MAX_MB = 512
+CHUNK_BYTES = MAX_MB*10**6 // MEMORY_PER_BYTE # ~32MB of text (about 7k packets) per pass
+
+FULL_RANGE = [[-10,16400],[-10,16400]] # the quick-look plots' X/Y range
+
+
+def chunk_for(max_mb, workers=1):
+    '''Chunk size that keeps workers conversions at once under max_mb MB.'''
+    return max(1 << 20, int(max_mb*10**6/workers/MEMORY_PER_BYTE))
+
+
+def _ranges(starts, ends):
+    '''Every index in [starts[i], ends[i]) for all i, as one array.'''
+    lengths = ends - starts
+    return np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+
+
+def _parse(text, path):
+    '''
+    Time stamps and words (a flat int64 array, PACKET_WORDS per packet) of the lines in text, parsed without making a
+    Python object per line: one scan each finds the brackets, and the tabs are looked for only in the short stretches
+    between a ']' and the next '[' (newline, index, time stamp). The word lists are then made into one comma separated
+    list by blanking out those stretches in a copy of the text, the time stamps are gathered by index, and numpy's text
+    parser reads each in one call.
+    '''
+    buf = np.frombuffer(text, dtype=np.uint8)
+    opens = np.flatnonzero(buf == ord('['))
+    closes = np.flatnonzero(buf == ord(']'))
+    if len(opens) == 0 and len(closes) == 0:
+        return np.zeros(0), np.zeros(0, dtype=np.int64)
+    if len(opens) != len(closes) or np.any(closes < opens) or np.any(opens[1:] < closes[:-1]):
+        raise ValueError('{}: unmatched brackets'.format(path))
+    heads = _ranges(np.append(0, closes[:-1] + 1), opens) # everything outside the brackets before each line's '['
+    tabs = heads[buf[heads] == ord('\t')]
+    before = np.searchsorted(tabs, opens) # a line's time stamp is between tabs[before - 2] and tabs[before - 1]
+    if np.any(before < 2) or np.any(tabs[np.maximum(before - 2, 0)] < np.append(0, closes[:-1])):
+        raise ValueError('{}: expected lines of <index>, <time stamp> and [<words>], tab separated'.format(path))
+    times = np.fromstring(buf[_ranges(tabs[before - 2] + 1, tabs[before - 1] + 1)].tobytes(), sep='\t')
+
+    payload = buf[opens[0] + 1:closes[-1]].copy()
+    payload[_ranges(closes[:-1], opens[1:] + 1) - (opens[0] + 1)] = ord(' ')
+    payload[closes[:-1] - (opens[0] + 1)] = ord(',')
+    words = np.fromstring(payload.tobytes(), dtype=np.int64, sep=',')
+    if len(times) != len(opens) or len(words) != len(opens)*PACKET_WORDS:
+        raise ValueError('{}: expected {} words per packet'.format(path, PACKET_WORDS))
+    return times, words
+
+
+def iter_vim(path, chunk_bytes=CHUNK_BYTES, start=0):
+    '''
+    Yield (time stamps, PACKET_DTYPE packets, byte offset just past the chunk) for consecutive chunks of a VIM dump, from
+    byte offset start (which has to be the beginning of a line).
+    '''
+    with open(path, 'rb') as f:
+        f.seek(start)
+        done = start
+        rest = b''
+        while True:
+            block = f.read(chunk_bytes)
+            text = rest + block
+            if not block:
+                rest = b''
+            else:
+                cut = text.rfind(b'\n') + 1 # only whole lines, the rest waits for the next block
+                text, rest = text[:cut], text[cut:]
+            done += len(text)
+            times, words = _parse(text, path)
+            if len(times):
+                yield times, words.astype('<u2').view(PACKET_DTYPE).reshape(-1), done
+            elif text:
+                yield np.zeros(0), np.zeros(0, dtype=PACKET_DTYPE), done
+            if not block:
+                break
+
+
+class QuickLook(PlotHistograms):
+    '''
+    Running histograms of one order for the OAxFORTIS_VIM2CSV.py plots, updated with every chunk of rows written (an
+    OAxFORTIS_hist.PlotHistograms: the X/Y image over FULL_RANGE, X projections over xrange with 1000 and 1500 bins, pulse
+    heights), plus the packet records (OAxFORTIS_eventstore.PACKET_RECORD: time stamp, packet num, num photons, rows) for the
+    count rates - each chunk goes through an EventTable.
+    '''
+    def __init__(self, xrange, bins=(355,355), proj_bins=(1000,1500)):
+        super().__init__(FULL_RANGE, bins, xrange, proj_bins, PH_EDGES)
+        self.xrange = xrange
+        self.nrows = 0
+        self._packets = []
+
+    def add(self, rows):
+        if len(rows) == 0:
+            return
+        table = EventTable.from_rows(rows)
+        packets = table.packets
+        packets['first'] += self.nrows
+        last = self._packets[-1] if self._packets else None
+        if last is not None and last['packetnum'][-1] == packets['packetnum'][0] and last['time'][-1] == packets['time'][0]:
+            last['count'][-1] += packets['count'][0] # a packet split over two chunks
+            packets = packets[1:]
+        if len(packets):
+            self._packets.append(packets)
+        self.nrows += len(rows)
+        super().add(table.events['X'], table.events['Y'], table.events['P'])
+
+    def packets(self):
+        '''PACKET_RECORD of every packet so far.'''
+        if not self._packets:
+            return np.zeros(0, dtype=PACKET_RECORD)
+        return np.concatenate(self._packets)
+
+
+def convert_vim(path, sink, t0=None, min_events=2, start=0, checkpoint=None, chunk_bytes=CHUNK_BYTES, quicklook=None, source=None):
+    '''
+    Expand every packet of a VIM dump with at least min_events events into event rows and write them to sink (e.g. an
+    OAxFORTIS_writers.CsvSink), one write per chunk of chunk_bytes, and add them to quicklook (a QuickLook) if given.
+    Time stamps are written relative to t0 (default: the dump's first packet). start is the byte offset to begin at;
+    checkpoint(t0, offset, rows so far) is called after each chunk's write. If source (the tdc number) is given, every
+    packet's summary goes to the sink too. Returns (t0, number of rows written).
+    '''
+    nrows = 0
+    for times, packets, offset in iter_vim(path, chunk_bytes, start):
+        if t0 is None and len(times):
+            t0 = times[0]
+        if len(times):
+            rows = expand_events(packets, times - t0, min_events=min_events)
+            if source is None:
+                sink.write(rows)
+            else:
+                sink.write(rows, packet_summary(packets, times - t0, source, min_events=min_events))
+            if quicklook is not None:
+                quicklook.add(rows)
+            nrows += len(rows)
+        if checkpoint is not None:
+            checkpoint(t0, offset, nrows)
+    return t0, nrows
+
+
+@contextlib.contextmanager
+def locked(path):
+    '''Hold an exclusive lock on path (created if need be) between processes for the length of a with block.'''
+    with open(path, 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX) # released when the file is closed
+            yield
+            return
+        while True:
+            try:
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                break
+            except OSError: # LK_LOCK gives up after 10 tries a second apart, keep waiting
+                pass
+        try:
+            yield
+        finally:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 24), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    '''
+    VIM_manifest.json of an output folder: {dump name: entry}. Every change is a locked read-modify-write followed by an
+    atomic replace, so the workers of a batch run can all record progress in the same file.
+    '''
+    def __init__(self, folder):
+        self.path = os.path.join(folder, MANIFEST)
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)['dumps']
+
+    def get(self, name):
+        return self._read().get(name)
+
+    def update(self, name, **fields):
+        with locked(self.path + '.lock'):
+            dumps = self._read()
+            dumps.setdefault(name, {}).update(fields)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'dumps': dumps}, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        return dumps[name]
+
+
+def dump_name(path):
+    '''Name a dump is recorded under: tdc_N/N_data-#.csv (the same whichever folder the dumps were downloaded to).'''
+    return os.path.join(os.path.basename(os.path.dirname(os.path.abspath(path))), os.path.basename(path))
+
+
+def file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def convert_recorded(path, outpath, t0=None, manifest=None, chunk_bytes=CHUNK_BYTES, quicklook=None, source=None):
+    '''
+    convert_vim from path into the csv outpath, recorded in the output folder's manifest (see MANIFEST above) so it's
+    skipped if already done, resumed if cut short and never written twice. quicklook (if given) gets all of the dump's
+    events, including those written on an earlier run. With source (the dump's tdc number), every packet also goes in
+    the output's packet summary. Returns (t0, events written this time, bytes of the dump read this time, 'converted',
+    'resumed' or 'skipped').
+    '''
+    manifest = manifest or Manifest(os.path.dirname(outpath) or '.')
+    name = dump_name(path)
+    sums = summary_path(outpath)
+    st = os.stat(path)
+    entry = manifest.get(name)
+    status = 'converted'
+    if entry is not None and entry['output'] == os.path.basename(outpath):
+        if 'sum_start' not in entry: # recorded before outputs had packet summaries
+            entry = manifest.update(name, sum_start=file_size(sums), sum_end=file_size(sums))
+        same = entry['size'] == st.st_size and entry['mtime'] == st.st_mtime
+        if not same and entry['size'] == st.st_size and entry['sha256'] == file_hash(path):
+            entry = manifest.update(name, mtime=st.st_mtime) # touched or copied, same contents
+            same = True
+        if same and entry['done']:
+            if quicklook is not None:
+                for rows in iter_rows(outpath, entry['out_start'], entry['out_end'], chunk_bytes):
+                    quicklook.add(rows)
+            return entry['t0'], 0, 0, 'skipped'
+        if same:
+            status = 'resumed'
+            if t0 is None:
+                t0 = entry['t0']
+        else: # new contents - what the old ones wrote goes
+            entry = manifest.update(name, size=st.st_size, mtime=st.st_mtime, sha256=file_hash(path), out_end=entry['out_start'],
+                                    sum_end=entry['sum_start'], offset=0, events=0, done=False)
+        for written, end in ((outpath, entry['out_end']), (sums, entry['sum_end'])):
+            if file_size(written) > end:
+                os.truncate(written, end) # a chunk that was written but never recorded
+        if quicklook is not None:
+            for rows in iter_rows(outpath, entry['out_start'], entry['out_end'], chunk_bytes):
+                quicklook.add(rows)
+    else:
+        out_start, sum_start = file_size(outpath), file_size(sums)
+        entry = manifest.update(name, output=os.path.basename(outpath), size=st.st_size, mtime=st.st_mtime, sha256=file_hash(path),
+                                out_start=out_start, out_end=out_start, sum_start=sum_start, sum_end=sum_start, offset=0, events=0,
+                                done=False, t0=t0)
+    start, before = entry['offset'], entry['events']
+
+    out = CsvSink(outpath, delimiter=',', summary=source is not None)
+    def checkpoint(t0, offset, nrows):
+        out.flush()
+        out.sync()
+        manifest.update(name, t0=t0, offset=offset, events=before + nrows, out_end=os.path.getsize(outpath), sum_end=file_size(sums))
+    try:
+        t0, nrows = convert_vim(path, out, t0, start=start, checkpoint=checkpoint, chunk_bytes=chunk_bytes, quicklook=quicklook, source=source)
+    finally:
+        out.close()
+    manifest.update(name, t0=t0, done=True)
+    return t0, nrows, st.st_size - start, status
+
+
+def first_time(path):
+    '''Time stamp of a dump's first packet (None if it has none) - what convert_vim uses as t0 by default.'''
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                return float(line.split(b'\t', 2)[1])
+    return None
+
+
+def dump_path(directory, tdc, filenum):
+    return os.path.join(directory, 'tdc_{}'.format(tdc), '{}_data-{}.csv'.format(tdc, filenum))
+
+
+def find_sets(directory):
+    '''File numbers (in numerical order) with an unprocessed dump in any of directory/tdc_0, tdc_1, tdc_2.'''
+    numbers = set()
+    for tdc, _ in ORDERS:
+        folder = os.path.join(directory, 'tdc_{}'.format(tdc))
+        if os.path.isdir(folder):
+            for name in os.listdir(folder):
+                match = DUMP_NAME.match(name)
+                if match and int(match.group(1)) == tdc:
+                    numbers.add(match.group(2))
+    return sorted(numbers, key=int)
+
+
+def set_start(directory, filenum):
+    '''Shared t0 of a set: first zero order packet, or the first packet of the first non-empty dump (as OAxFORTIS_VIM2CSV.py).'''
+    for tdc, _ in ORDERS:
+        path = dump_path(directory, tdc, filenum)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            t0 = first_time(path)
+            if t0 is not None:
+                return t0
+    return None
+
+
+def convert_job(path, outpath, t0, chunk_bytes=CHUNK_BYTES, source=None):
+    '''One dump to one output csv, run in a worker process. Returns (events, bytes read, seconds, status).'''
+    start = time.perf_counter()
+    if not os.path.exists(path): # counts as empty
+        open(outpath, 'a').close()
+        return 0, 0, 0., 'missing'
+    _, nrows, nbytes, status = convert_recorded(path, outpath, t0, chunk_bytes=chunk_bytes, source=source)
+    return nrows, nbytes, time.perf_counter() - start, status
+
+
+def convert_batch(directory, folder, jobs=None, max_mb=MAX_MB):
+    '''
+    Convert every unprocessed set in directory into folder, jobs processes at a time (default: one per CPU) using about
+    max_mb MB between them.
+    Returns [(file number, dump, events, bytes read, seconds, status, error or None)] and the total wall time.
+    '''
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    numbers = find_sets(directory)
+    work = []
+    for filenum in numbers:
+        t0 = set_start(directory, filenum)
+        for tdc, order in ORDERS:
+            path = dump_path(directory, tdc, filenum)
+            work.append((filenum, tdc, path, os.path.join(folder, '{}_VIM#{}.csv'.format(order, filenum)), t0))
+    work.sort(key=lambda w: -file_size(w[2])) # biggest first keeps the pool busy to the end
+    # fork where there is one: workers don't need to re-import the script that started them
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    jobs = jobs or os.cpu_count() or 1
+    chunk_bytes = chunk_for(max_mb, min(jobs, len(work)))
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+        futures = {pool.submit(convert_job, path, outpath, t0, chunk_bytes, tdc): (filenum, path) for filenum, tdc, path, outpath, t0 in work}
+        for future in as_completed(futures):
+            filenum, path = futures[future]
+            try:
+                nrows, nbytes, seconds, status = future.result()
+                results.append((filenum, path, nrows, nbytes, seconds, status, None))
+                print('{}: {} events ({})'.format(path, nrows, status))
+            except Exception as e:
+                results.append((filenum, path, 0, 0, 0., 'failed', e))
+                print('{}: FAILED ({})'.format(path, e))
+    elapsed = time.perf_counter() - start
+
+    failed = {r[0] for r in results if r[6] is not None}
+    for filenum in numbers:
+        if filenum in failed:
+            continue
+        for tdc, _ in ORDERS:
+            path = dump_path(directory, tdc, filenum)
+            if os.path.exists(path):
+                os.rename(path, path[:-len('.csv')] + 'processed.csv')
+    results.sort(key=lambda r: (int(r[0]), r[1]))
+    return results, elapsed
+
+
+def print_summary(results, elapsed):
+    print('\n{:>36} {:>10} {:>9} {:>8} {:>8} {:>11}'.format('dump', 'events', 'MB', 's', 'MB/s', 'events/s'))
+    for filenum, path, nrows, nbytes, seconds, status, error in results:
+        name = os.path.join(*path.split(os.sep)[-2:])
+        if error is not None:
+            print('{:>36}  FAILED: {}'.format(name, error))
+            continue
+        print('{:>36} {:>10} {:>9.1f} {:>8.2f} {:>8.1f} {:>11.0f}'.format(name, nrows, nbytes/1e6, seconds, nbytes/1e6/max(seconds, 1e-9), nrows/max(seconds, 1e-9))
+              + ('' if status == 'converted' else '  ' + status))
+    nrows = sum(r[2] for r in results)
+    nbytes = sum(r[3] for r in results)
+    print('{:>36} {:>10} {:>9.1f} {:>8.2f} {:>8.1f} {:>11.0f}  (wall clock)'.format('total', nrows, nbytes/1e6, elapsed, nbytes/1e6/max(elapsed, 1e-9), nrows/max(elapsed, 1e-9)))
+
+
+def arguments(argv=None, batch=True):
+    '''Command line of batch mode (a folder is required) or of OAxFORTIS_VIM2CSV.py (without one it asks as it always did).'''
+    parser = argparse.ArgumentParser(description='Convert every unprocessed VIM dump set in a folder, in parallel.')
+    parser.add_argument('directory', nargs=None if batch else '?', help='folder holding tdc_0, tdc_1 and tdc_2')
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument('--today', action='store_true', help="write to ../<today's date>")
+    where.add_argument('--folder', default='UnknownDate', help='write to ../FOLDER (default UnknownDate)')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--max-mb', type=float, default=MAX_MB, help='memory to convert with, in MB (default %d)'%MAX_MB)
+    return parser.parse_args(argv)
+
+
+def main(argv=None, args=None):
+    args = args or arguments(argv)
+
+    if not find_sets(args.directory):
+        print('Nothing to convert in {}'.format(args.directory))
+        return 0
+    folder = os.path.join(args.directory, '..', str(datetime.date.today()) if args.today else args.folder)
+    results, elapsed = convert_batch(args.directory, folder, args.jobs, args.max_mb)
+    print_summary(results, elapsed)
+    return 1 if any(r[6] is not None for r in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,8 +9,16 @@ Each event/photon corresponds to a row in a csv file, with each row containing t
 Calculations are done to produce the figures listed in OUTPUT.
 
 INSTRUCTIONS: run below in command line, the modifier must be the same as what was used to run OAxFORTIS_datacollect.py
-                    python3 OAxFORTISplots.py <modifier>
+                    python3 OAxFORTISplots.py <modifier> [start end]
               You will then be asked to input the date (YYYY-MM-DD) you collected the data
+              start and end (packet time stamps in seconds) plot just that part of the run. For runs written in segments
+              (datacollect --rotate-mb/--rotate-min) only the segments covering it are read.
+              Each file is read once, a chunk at a time, straight into the histograms, so runs of any length (multi-GB) can be
+              plotted without holding their events in memory (see OAxFORTIS_stream.py).
+              The first time a csv is plotted it is also saved next to itself in compact binary form (<file>.csv.rows), which later runs
+              load almost instantly (see OAxFORTIS_load.py) - delete those files whenever you like.
+              Count rates and packet loss (printed for each order) come from the packet summaries written alongside the data
+              (<order>_<modifier>.pks, see OAxFORTIS_eventstore.py), or for older runs without them, from the packets in the files.
               
 OUTPUT: 3 Windows will pop up with the following figures:
         (1) XY 2D histograms for each order with y-axis count projections
@@ -20,11 +28,15 @@ OUTPUT: 3 Windows will pop up with the following figures:
 '''
 
 import matplotlib.pyplot as plt
-import csv
 import os
 import sys
 import numpy as np
 import matplotlib
+from OAxFORTIS_segments import read_summary
+from OAxFORTIS_stream import histogram_run
+from OAxFORTIS_hist import PlotHistograms
+from OAxFORTIS_rates import rate_curve
+from OAxFORTIS_stats import summary_tracker
 from matplotlib import colors
 np.set_printoptions(threshold=sys.maxsize)
 matplotlib.rcParams.update({'font.size': 7})
@@ -36,10 +48,11 @@ class color:
 
 
 ######### --- Inputs --- ############
-if len(sys.argv) == 2:
+if len(sys.argv) in (2, 4):
     modifier = sys.argv[1]
+    window = (float(sys.argv[2]), float(sys.argv[3])) if len(sys.argv) == 4 else (None, None)
 else:
-    print("Run like : python3 OAxFORTISplots.py <arg1:filename modifier used to run Server.py>")
+    print("Run like : python3 OAxFORTISplots.py <arg1:filename modifier used to run Server.py> [<arg2:start time (s)> <arg3:end time (s)>]")
     exit(1)
     
 date = input(color.BOLD + "Enter Date of Data Collection as YYYY-MM-DD: " + color.END)
@@ -65,53 +78,46 @@ CountsS = CountsS[np.insert(np.diff(TimesS).astype(bool), 0, True)]
 packnumS = Single.T[0]
 '''
 
-data0 = []       # packet data (each row contain x coordinate, y coordinate, pulse height)
-ZeroFile = './Zero_{}.csv'.format(modifier)
-if os.path.getsize(ZeroFile) > 0:  #checks if file has any data
-    Zero = np.loadtxt(ZeroFile, delimiter=',') #you'll need to change delimiter to /t (for all 3 channels) for any data collected before 11/16/23
-    for row in Zero:
-        if int(row[4]) != 0:    #pulse height restrictions
-            data0.append([int(row[2]),int(row[3]),int(row[4])])
-    data0 = np.asarray(data0)
-    Times = Zero.T[1] # Packet Time Stamp
-    Time0 = Times[np.insert(np.diff(Times).astype(bool), 0, True)] #skip repeats in each packet
+# each order is read once, a chunk at a time, straight into its histograms (OAxFORTIS_stream.py / OAxFORTIS_hist.PlotHistograms:
+# X/Y image, small and large X projections, pulse heights - only events with a non-zero pulse height), so a run of any length
+# plots in the same memory. csv files are also cached next to themselves on the first pass, see OAxFORTIS_load.py.
+# Packet time stamps, num photons and packet nums come from the packet summary (one record per packet received, with events
+# or not - see OAxFORTIS_eventstore.py), or for runs written before there were summaries, from the packets in the files.
+hist0 = PlotHistograms([[2400,12600],[1850,12050]])
+summary0 = read_summary('./Zero_{}'.format(modifier), *window)
+packets0 = histogram_run('./Zero_{}'.format(modifier), hist0, *window, packets=len(summary0) == 0) #tab delimited files (collected before 11/16/23) are recognized automatically
+if hist0.events > 0:
+    packets0 = summary0 if len(summary0) else packets0
+    Time0 = packets0['time'] # Packet Time Stamp
     Time0b = np.insert(Time0, 0, 0., axis=0) #array of previous times, add zero to beginning to offset time stamp array
     Time0b = np.delete(Time0b,-1)
-    Counts0 = Zero.T[5] # Num Photons in each Packet
-    Counts0 = Counts0[np.insert(np.diff(Times).astype(bool), 0, True)]
-    packnum0 = Zero.T[0]
-
-datap1 = []
-Pos1File = './Pos1_{}.csv'.format(modifier)
-if os.path.getsize(Pos1File) > 0:
-    Pos1 = np.loadtxt(Pos1File, delimiter=',')
-    for row in Pos1:
-        if int(row[4]) != 0:
-            datap1.append([int(row[2]),int(row[3]),int(row[4])])
-    datap1 = np.asarray(datap1)
-    Times = Pos1.T[1]
-    Timep1 = Times[np.insert(np.diff(Times).astype(bool), 0, True)]
+    Counts0 = packets0['n'] # Num Photons in each Packet
+    packnum0 = packets0['packetnum']
+    print('Zero: %d packets, '%len(packets0) + summary_tracker(packets0).summary()) #packet loss from the packet numbers
+
+histp1 = PlotHistograms([[3200,13300],[2300,12200]])
+summaryp1 = read_summary('./Pos1_{}'.format(modifier), *window)
+packetsp1 = histogram_run('./Pos1_{}'.format(modifier), histp1, *window, packets=len(summaryp1) == 0)
+if histp1.events > 0:
+    packetsp1 = summaryp1 if len(summaryp1) else packetsp1
+    Timep1 = packetsp1['time']
     Timep1b = np.insert(Timep1, 0, 0., axis=0)
     Timep1b = np.delete(Timep1b,-1)
-    Countsp1 = Pos1.T[5]
-    Countsp1 = Countsp1[np.insert(np.diff(Times).astype(bool), 0, True)]
-    packnump1 = Pos1.T[0]
-
-datan1 = []
-Neg1File = './Neg1_{}.csv'.format(modifier)
-if os.path.getsize(Neg1File) > 0:
-    Neg1 = np.loadtxt(Neg1File, delimiter=',')
-    for row in Neg1:
-        if int(row[4]) != 0:
-            datan1.append([int(row[2]),int(row[3]),int(row[4])])
-    datan1 = np.asarray(datan1)
-    Times = Neg1.T[1]
-    Timen1 = Times[np.insert(np.diff(Times).astype(bool), 0, True)]
+    Countsp1 = packetsp1['n']
+    packnump1 = packetsp1['packetnum']
+    print('Pos1: %d packets, '%len(packetsp1) + summary_tracker(packetsp1).summary())
+
+histn1 = PlotHistograms([[3450,13350],[2000,11700]]) #Steve's: [[1900,13400],[2100,12890]] #mine old: [[2000,13500],[2100,12700]]
+summaryn1 = read_summary('./Neg1_{}'.format(modifier), *window)
+packetsn1 = histogram_run('./Neg1_{}'.format(modifier), histn1, *window, packets=len(summaryn1) == 0)
+if histn1.events > 0:
+    packetsn1 = summaryn1 if len(summaryn1) else packetsn1
+    Timen1 = packetsn1['time']
     Timen1b = np.insert(Timen1, 0, 0., axis=0)
     Timen1b = np.delete(Timen1b,-1)
-    Countsn1 = Neg1.T[5]
-    Countsn1 = Countsn1[np.insert(np.diff(Times).astype(bool), 0, True)]
-    packnumn1 = Neg1.T[0]
+    Countsn1 = packetsn1['n']
+    packnumn1 = packetsn1['packetnum']
+    print('Neg1: %d packets, '%len(packetsn1) + summary_tracker(packetsn1).summary())
 
 ####### WFF playbacks
 '''
@@ -184,19 +190,19 @@ inlindis=20
 dl=20*63.5
 asp = 43/63.5
 
-if len(data0)>0:
+if hist0.events>0:
     ## Zero Order 2D Histogram
-    init0,_,_ = np.histogram2d(data0.T[0], data0.T[1], bins=[355,355], range=[[2400,12600],[1850,12050]], density=True)
+    init0 = hist0.density() #range=[[2400,12600],[1850,12050]]
     XY0.imshow(init0.T, interpolation='nearest', origin='lower', aspect='auto', cmap='magma', norm = colors.LogNorm(), extent=[2400,12600,1850,12050])
     XY0.set_title('Zero Order')
     XY0.set_xlabel('X')
     
     ## Small Projection
-    n, bins, _ = Proj0.hist(data0.T[0], 1000, range=[2400,12600], color='black', histtype='step')
+    n, bins, _ = Proj0.hist(hist0.proj_edges[0][:-1], hist0.proj_edges[0], weights=hist0.proj[0], color='black', histtype='step')
     Proj0.set_xlim(2400,12600)
     
     ## Large Projection
-    n, bins, _ = prjs[1].hist(data0.T[0], 1500, range=[2400,12600], color='darkorange', histtype='step',label='Zero Order')
+    n, bins, _ = prjs[1].hist(hist0.proj_edges[1][:-1], hist0.proj_edges[1], weights=hist0.proj[1], color='darkorange', histtype='step',label='Zero Order')
     #prjs[1].set_yscale('log')
     #prjs[1].set_ylim(0,1000)
     prjs[1].set_xlim(2400,12600)
@@ -204,40 +210,40 @@ if len(data0)>0:
     prjs[1].set_ylabel('Projected Counts')
 
     
-if len(datap1)>0:
+if histp1.events>0:
     ## +1 Order 2D Histogram
-    initp1,_,_ = np.histogram2d(datap1.T[0], datap1.T[1], bins=[355,355], range=[[3200,13300],[2300,12200]], density=True)
+    initp1 = histp1.density() #range=[[3200,13300],[2300,12200]]
     XYp1.imshow(initp1.T, interpolation='nearest', origin='lower', aspect='auto', cmap='magma', norm = colors.LogNorm(), extent=[3200,13300,2300,12200])
     XYp1.set_title('+1 Order (270°)')
     
     ## Small Projection
-    n, bins, _ = Projp1.hist(datap1.T[0], 1000, range=[3200,13300], color='black', histtype='step')
+    n, bins, _ = Projp1.hist(histp1.proj_edges[0][:-1], histp1.proj_edges[0], weights=histp1.proj[0], color='black', histtype='step')
     Projp1.set_xlim(3200,13300)
     
     ## Large Projection
-    n, bins, _ = prjs[0].hist(datap1.T[0], 1500, range=[3200,13300], color='mediumblue', histtype='step',label='+1 Order')
+    n, bins, _ = prjs[0].hist(histp1.proj_edges[1][:-1], histp1.proj_edges[1], weights=histp1.proj[1], color='mediumblue', histtype='step',label='+1 Order')
     #prjs[0].set_yscale('log')
     #prjs[0].set_ylim(0,50)
     prjs[0].set_xlim(3200,13300)
     prjs[0].legend()
     
     
-if len(datan1)>0:
+if histn1.events>0:
     ## -1 Order 2D Histogram
-    initn1,_,_ = np.histogram2d(datan1.T[0], datan1.T[1], bins=[355,355], range=[[3450,13350],[2000,11700]], density=True) #Steve's: [[1900,13400],[2100,12890]] #mine old: [[2000,13500],[2100,12700]]
+    initn1 = histn1.density() #range=[[3450,13350],[2000,11700]]
     XYn1.imshow(initn1.T, interpolation='nearest', origin='lower',aspect='auto', cmap='magma', norm = colors.LogNorm(), extent=[3450,13350,2000,11700])
     XYn1.set_title('-1 Order (90°)')
     XYn1.set_ylabel('Y')
     XYn1.invert_xaxis()
     
     ## Small Projection
-    n, bins, _ = Projn1.hist(datan1.T[0], 1000, range=[3450,13350], color='black', histtype='step')
+    n, bins, _ = Projn1.hist(histn1.proj_edges[0][:-1], histn1.proj_edges[0], weights=histn1.proj[0], color='black', histtype='step')
     Projn1.set_xlim(3450,13350)
     Projn1.set_ylabel('Projected Counts')
     Projn1.invert_xaxis()
     
     ## Large Projection
-    n, bins, _ = prjs[2].hist(datan1.T[0], 1500, range=[3450,13350], color='mediumvioletred', histtype='step',label='-1 Order')
+    n, bins, _ = prjs[2].hist(histn1.proj_edges[1][:-1], histn1.proj_edges[1], weights=histn1.proj[1], color='mediumvioletred', histtype='step',label='-1 Order')
     #prjs[2].set_yscale('log')
     #prjs[2].set_ylim(0,1000)
     prjs[2].set_xlim(3450,13350)
@@ -248,12 +254,12 @@ if len(datan1)>0:
 
 
 ############# --- Pulse Height Histograms --- ##############################################
-if len(data0)>0:
-    n, bins, _ = PH.hist(data0.T[2], bins = np.arange(10,260,10), color = 'darkorange', lw=2, histtype='step', label='Zero Order') #max pulse height is 255
-if len(datap1)>0:
-    n, bins, _ = PH.hist(datap1.T[2], bins = np.arange(10,260,10), color = 'mediumblue', lw=2, histtype='step', label='+1 Order')
-if len(datan1)>0:
-    n, bins, _ = PH.hist(datan1.T[2], bins = np.arange(10,260,10), color = 'mediumvioletred', lw=2, histtype='step', label='-1 Order')
+if hist0.events>0:
+    n, bins, _ = PH.hist(hist0.ph_edges[:-1], bins=hist0.ph_edges, weights=hist0.ph, color = 'darkorange', lw=2, histtype='step', label='Zero Order') #max pulse height is 255
+if histp1.events>0:
+    n, bins, _ = PH.hist(histp1.ph_edges[:-1], bins=histp1.ph_edges, weights=histp1.ph, color = 'mediumblue', lw=2, histtype='step', label='+1 Order')
+if histn1.events>0:
+    n, bins, _ = PH.hist(histn1.ph_edges[:-1], bins=histn1.ph_edges, weights=histn1.ph, color = 'mediumvioletred', lw=2, histtype='step', label='-1 Order')
 PH.legend()
 PH.set_title('Pulse Height Histograms')
 PH.set_xlabel('Pulse Height')
@@ -263,56 +269,35 @@ PH.set_ylabel('# of Events')
 
 ############## --- Count Rate Calculations --- ####################################################
 # Average Count Rates = num of events / total time data taken
-if len(data0)>0:
-    AvgCntRt_0 = len(data0.T[0])/(Time0[-1]-Time0[0]) #used to use sum(Counts0) instead of len(data0.T[0])
+if hist0.events>0:
+    AvgCntRt_0 = hist0.events/(Time0[-1]-Time0[0]) #used to use sum(Counts0) instead of hist0.events
     text_0 = '%.3f counts/s'%(AvgCntRt_0)
     #print('Zero Avg Rate: ',text_0)
     #plt.gcf().text(0.48, 0.26, text_0, fontsize=10, weight="bold") 
-if len(datap1)>0:
-    AvgCntRt_p1 = len(datap1.T[0])/(Timep1[-1]-Timep1[0])
+if histp1.events>0:
+    AvgCntRt_p1 = histp1.events/(Timep1[-1]-Timep1[0])
     text_p1 = '%.0f counts/s'%(AvgCntRt_p1) 
     #plt.gcf().text(0.48, 0.35, text_p1, fontsize=10, weight="bold") 
-if len(datan1)>0:
-    AvgCntRt_n1 = len(datan1.T[0])/(Timen1[-1]-Timen1[0])
+if histn1.events>0:
+    AvgCntRt_n1 = histn1.events/(Timen1[-1]-Timen1[0])
     text_n1 = '%.0f counts/s'%(AvgCntRt_n1) 
     #plt.gcf().text(0.48, 0.17, text_n1, fontsize=10, weight="bold") 
 
 
 # Instantaneous Rate Plots
-#only calculate rate at every 1.5sec timestamp interval
-if len(data0)>0:
-    last_calculation_time = 0
-    InstRt0 = []
-    T0 = []
-    for o in range(len(Time0)-1):
-        if Time0[o] - last_calculation_time >= 1.5:
-            InstRt0.append(Counts0[o]/(Time0[o]-Time0b[o]))
-            T0.append(Time0[o])
-            last_calculation_time = Time0[o]
-if len(datap1)>0:
-    InstRtp1 = []
-    Tp1 = []
-    last_calculation_time = 0
-    for p in range(len(Timep1)-1):
-        if Timep1[p] - last_calculation_time >= 1.5:
-            InstRtp1.append(Countsp1[p]/(Timep1[p]-Timep1b[p]))
-            Tp1.append(Timep1[p])
-            last_calculation_time = Timep1[p]
-if len(datan1)>0:
-    InstRtn1 = []
-    Tn1 = []
-    last_calculation_time = 0
-    for n in range(len(Timen1)-1):
-        if Timen1[n] - last_calculation_time >= 1.5:
-            InstRtn1.append(Countsn1[n]/(Timen1[n]-Timen1b[n]))
-            Tn1.append(Timen1[n])
-            last_calculation_time = Timen1[n]
-
-if len(data0)>0:
+#rate over every 1.5sec of packets - the same sliding window rate the live display shows (see OAxFORTIS_rates.py)
+if hist0.events>0:
+    T0, InstRt0 = rate_curve(packets0['time'], packets0['count'], step=1.5)
+if histp1.events>0:
+    Tp1, InstRtp1 = rate_curve(packetsp1['time'], packetsp1['count'], step=1.5)
+if histn1.events>0:
+    Tn1, InstRtn1 = rate_curve(packetsn1['time'], packetsn1['count'], step=1.5)
+
+if hist0.events>0:
     CR.plot(T0, InstRt0, lw=2, color='darkorange', label='Zero Order')
-if len(datap1)>0:
+if histp1.events>0:
     CR.plot(Tp1, InstRtp1, lw=2, color='mediumblue', label='+1 Order')
-if len(datan1)>0:
+if histn1.events>0:
     CR.plot(Tn1, InstRtn1, lw=2, color='mediumvioletred', label='-1 Order')
 CR.legend()
 CR.set_ylabel('Instantaneous Rate of Events (counts/s)')